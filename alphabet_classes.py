@@ -0,0 +1,101 @@
+"""Alphabet compression: partition the alphabet into classes of symbols which a regexp cannot
+tell apart, and rewrite the regexp over one symbol per class.
+
+The regexp tests symbols with its atoms and its disjunctions of atoms (e.g., `(a+b+c)`, a
+"character class"). Two symbols are in the same class when every such set contains both
+or neither; all the symbols the regexp never mentions form one more class. Each set is a
+union of classes, so it is rewritten as the disjunction of those classes' ids, and
+
+    word in L(tree)  <=>  translate(word) in L(compressed tree)
+
+Words are translated once through a lookup table, after which every method works on the
+class ids: automaton transitions and derivative caches are per class, so their size grows
+with the regexp and not with the alphabet.
+"""
+
+from FAdo.reex import *
+from utils import alphabet
+
+
+def _atom_set(tree: RegExp) -> set[str]|None:
+    """The symbols of an atom or a disjunction of only atoms, otherwise None"""
+    if type(tree) is CAtom:
+        return {tree.val}
+    if type(tree) is CDisj:
+        left = _atom_set(tree.arg1)
+        right = _atom_set(tree.arg2) if left is not None else None
+        if right is not None:
+            return left | right
+    return None
+
+
+def _atom_sets(tree: RegExp) -> list[set[str]]:
+    """The maximal atom sets of the tree (see `_atom_set`)"""
+    sets = list()
+    stack = [tree]
+    while len(stack) > 0:
+        node = stack.pop()
+        symbols = _atom_set(node)
+        if symbols is not None:
+            sets.append(symbols)
+        elif type(node) in (CConcat, CDisj):
+            stack.extend([node.arg1, node.arg2])
+        elif type(node) is CStar:
+            stack.append(node.arg)
+    return sets
+
+
+class _Table(dict):
+    """symbol code point => class id, defaulting to the id of the unmentioned symbols"""
+    def __init__(self, other: str):
+        super().__init__()
+        self.other = other
+
+    def __missing__(self, key: int) -> str:
+        return self.other
+
+
+class AlphabetCompression:
+    def __init__(self, tree: RegExp):
+        sets = _atom_sets(tree)
+
+        # refine the partition by each set: symbols with the same signature are in one class
+        signatures = dict()
+        for i, symbols in enumerate(sets):
+            for symbol in symbols:
+                signatures.setdefault(symbol, list()).append(i)
+        classes = dict()
+        for symbol in sorted(signatures):
+            classes.setdefault(tuple(signatures[symbol]), list()).append(symbol)
+        self.classes = list(classes.values())
+
+        ids = alphabet(len(self.classes) + 1)
+        self.other = ids[-1]
+        self.table = _Table(self.other)
+        self.id_of = dict()
+        for id, symbols in zip(ids, self.classes):
+            for symbol in symbols:
+                self.table[ord(symbol)] = id
+                self.id_of[symbol] = id
+        self.tree = self._rewrite(tree, set(ids))
+
+    def translate(self, word: str) -> str:
+        """The word over the class ids"""
+        return word.translate(self.table)
+
+    def _rewrite(self, tree: RegExp, sigma: set[str]) -> RegExp:
+        symbols = _atom_set(tree)
+        if symbols is not None:
+            ids = sorted(set(self.id_of[symbol] for symbol in symbols))
+            rewritten = CAtom(ids[0], sigma)
+            for id in ids[1:]:
+                rewritten = CDisj(rewritten, CAtom(id, sigma), sigma)
+            return rewritten
+
+        return {
+            CEpsilon:   lambda: CEpsilon(sigma),
+            CEmptySet:  lambda: CEmptySet(sigma),
+            CConcat:    lambda: CConcat(self._rewrite(tree.arg1, sigma), self._rewrite(tree.arg2, sigma), sigma),
+            CDisj:      lambda: CDisj(self._rewrite(tree.arg1, sigma), self._rewrite(tree.arg2, sigma), sigma),
+            CStar:      lambda: CStar(self._rewrite(tree.arg, sigma), sigma),
+        }[type(tree)]()
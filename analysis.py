@@ -3,27 +3,55 @@
 $ python analysis.py data
 """
 import os
-from math import sqrt
-from statistics import fmean, stdev
+from statistics import fmean
+import numpy as np
 from scipy import stats
 import matplotlib.pyplot as plt
 from utils import *
 from methods import METHODS
+from results import ResultsStore, Aggregate
+from scheduling import read_schedule_log
 
 
-def text_avg(data: dict[Callable, dict[int, list[float]]]):
-    for method in data:
+def analysed_methods(agg: Aggregate) -> list[Callable]:
+    """The methods which have been measured on any regexp in the aggregate"""
+    return [method for method in METHODS if OutputFileEntry.method_time_key(method) in agg.count
+            and np.any(agg.count[OutputFileEntry.method_time_key(method)] > 0)]
+
+
+def text_avg(agg: Aggregate):
+    for method in analysed_methods(agg):
         print(method.__name__, method.__doc__)
-        for length in sorted(data[method].keys()):
-            print("\t", str(length).ljust(5), fmean(data[method][length]))
+        for length, mean in zip(agg.lengths, agg.mean[OutputFileEntry.method_time_key(method)]):
+            print("\t", str(length).ljust(5), mean)
 
 
-def avg_word_length_per_regexp_length(data: dict[int, list[float]]):
+def avg_word_length_per_regexp_length(agg: Aggregate):
     print("\nlen(re)", "fmean(word length)")
-    for regexp_length in sorted(data.keys()):
-        print(str(regexp_length).ljust(7), fmean(data[regexp_length]))
-
-def display(data: dict[Callable, dict[int, list[float]]]):
+    for regexp_length, mean in zip(agg.lengths, agg.mean["avg_word_length"]):
+        print(str(regexp_length).ljust(7), mean)
+
+def schedule_accuracy(schedule_file: str):
+    """How well did the scheduler's cost model rank the regexps, and once it was calibrated,
+    predict their wall time? (see scheduling.py)"""
+    rows = read_schedule_log(schedule_file)
+    if len(rows) < 2:
+        return
+    structural, predicted, actual, _ = zip(*rows)
+    rho, _ = stats.spearmanr(structural, actual)
+    print("\nScheduling cost model over", len(rows), "regexps")
+    print("\tSpearman rank correlation (structural cost, actual seconds):", rho)
+
+    # the first regexps of a campaign are scheduled before there is anything to calibrate with
+    calibrated = [(p, a) for p, a in zip(predicted, actual) if not np.isnan(p)]
+    if len(calibrated) < 2:
+        print("\tThe cost model was not calibrated in seconds for enough regexps yet")
+        return
+    rho, _ = stats.spearmanr(*zip(*calibrated))
+    print("\tSpearman rank correlation (predicted, actual seconds) over", len(calibrated), "regexps:", rho)
+    print("\tMean absolute error in seconds:", fmean(abs(p - a) for p, a in calibrated))
+
+def display(agg: Aggregate):
     fig, ax = plt.subplots()
     lines = {}
 
@@ -33,15 +61,11 @@ def display(data: dict[Callable, dict[int, list[float]]]):
     alpha = 1 - CONFIDENCE_LEVEL
     z_alpha_by_2 = stats.norm.ppf(1 - alpha/2)
 
-    for method in data:
-        lengths = []
-        mean_times = []
-        std_errs = []
-        for length in sorted(data[method].keys()):
-            times = data[method][length]
-            lengths.append(length)
-            mean_times.append(fmean(times))
-            std_errs.append(z_alpha_by_2 * stdev(times)/sqrt(len(times)))
+    for method in analysed_methods(agg):
+        key = OutputFileEntry.method_time_key(method)
+        lengths = agg.lengths
+        mean_times = agg.mean[key]
+        std_errs = z_alpha_by_2 * agg.stdev(key) / np.sqrt(agg.count[key])
 
         line = ax.errorbar(
             x=lengths,
@@ -81,7 +105,34 @@ def display(data: dict[Callable, dict[int, list[float]]]):
     ax.set_ylim(ymin=0.0)
     ax.set_ylabel("Mean time in seconds to decide membership\n"
                  f"(error bars define {CONFIDENCE_LEVEL * 100}% confidence interval)")
-    plt.show()
+
+
+def display_word_lengths(word_length_file: str):
+    """Plot the mean time per word against the word length (see word_length_benchmarks.py)"""
+    # method => word length => [time per word]
+    data = dict((method, dict()) for method in METHODS)
+    with open(word_length_file, "r") as handle:
+        for line in handle:
+            entry = OutputFileEntry.from_json_str(line)
+            nwords = entry.nwords_acc + entry.nwords_rej
+            for method in data:
+                if not np.isnan(entry.get_time(method)): # NaN: the method was too slow for this length
+                    times = data[method].get(int(entry.avg_word_length), list())
+                    times.append(entry.get_time(method) / nwords)
+                    data[method][int(entry.avg_word_length)] = times
+
+    fig, ax = plt.subplots()
+    for method in data:
+        lengths = sorted(data[method].keys())
+        ax.plot(lengths, [fmean(data[method][length]) for length in lengths],
+                label=method.__name__, linewidth=1, marker=".")
+
+    ax.legend(fancybox=True, shadow=True, loc="upper left")
+    ax.set_title("Comparing how membership time scales with the word length")
+    ax.set_xscale("log")
+    ax.set_xlabel("Length of the word")
+    ax.set_yscale("log")
+    ax.set_ylabel("Mean time in seconds to decide membership")
 
 
 if __name__ == "__main__":
@@ -93,31 +144,28 @@ if __name__ == "__main__":
               f"First you must 'python run_benchmarks {datadir}'")
         exit(1)
 
-    # method => length => [sorted times]
-    data = dict((method, dict()) for method in METHODS)
-    avg_word_len_per_re_len = dict()
-
-    handle = open(output_file, "r")
-    for line in handle.readlines():
-        entry = OutputFileEntry.from_json_str(line)
-        nwords = entry.nwords_acc + entry.nwords_rej
-
-        lengths = avg_word_len_per_re_len.get(entry.length, list())
-        lengths.append(entry.avg_word_length)
-        avg_word_len_per_re_len[entry.length] = lengths
-
-        for method in data:
-            times = data[method].get(entry.length, list())
-            times.append(entry.get_time(method) / nwords) # average time per word
-            data[method][entry.length] = times
+    # the columnar store is updated by run_benchmarks.py, but older data directories only
+    # have the json lines output file
+    store = ResultsStore(os.path.join(datadir, config().files.data_columns))
+    if not store.exists():
+        print(f"Building {store.directory} from {output_file}")
+    if not store.sync(output_file):
+        print(f"{store.directory} and {output_file} have a different number of results. "
+              f"Please delete {store.directory} so it is rebuilt from {output_file}")
+        exit(1)
 
-    handle.close()
-    for lengths in data.values():
-        for times in lengths.values():
-            times.sort()
+    # length => per-word time statistics of each method, updated from the last processed row
+    agg = store.aggregate()
 
     ### PERFORM ANALYSIS ON DATA
 
-    text_avg(data)
-    avg_word_length_per_regexp_length(avg_word_len_per_re_len)
-    display(data)
+    text_avg(agg)
+    avg_word_length_per_regexp_length(agg)
+    schedule_file = os.path.join(datadir, config().files.schedule_log)
+    if os.path.exists(schedule_file):
+        schedule_accuracy(schedule_file)
+    display(agg)
+    word_length_file = os.path.join(datadir, config().files.word_length_output)
+    if os.path.exists(word_length_file):
+        display_word_lengths(word_length_file)
+    plt.show()
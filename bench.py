@@ -0,0 +1,241 @@
+"""Performance regression suite for the methods in `methods.py::METHODS`.
+
+A fixed corpus of regular expressions (one per configured length) with their accepting and
+rejecting words is checked in at bench/corpus.json. Every method decides all the words of a
+regexp in a pass, the passes of the methods are interleaved, and the fastest time of each word
+over `--repeats` passes is kept. A word which is decided in less than `--min-seconds` (too close
+to the timer's resolution) is decided again and again until the calls add up to that, and
+timed as their mean. The derivative cache is emptied before each pass, so pdcache
+only shares derivatives between the words of one regexp, and each pass compiles its own tree,
+so the automata of pddag_once, pddag_min, follow_once, and follow_min are built and reduced
+again (on new trees while short of `--min-seconds`); the fastest build and reduction of each
+regexp are compared like another word (build4pddag, reduce4pddag, ...). Compared with a
+stored baseline, the times of a method are summed per regexp. A method is suspected of a
+regression when its total is more than the allowed slowdown above the baseline's and its
+per-regexp ratios are significantly above 1 (one-sided Wilcoxon signed-rank test); with too
+few regexps to ever reach the significance level it is reported as untested instead. Suspected
+methods are measured again, keeping the fastest of both measurements, and only regressions
+which persist are reported. The baseline is machine specific, so it is not checked in.
+
+$ python bench.py --save    # run and store the baseline (bench/baseline.json)
+$ python bench.py           # run and compare against the baseline; exits 1 on regressions
+$ python bench.py --make-corpus
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+from hashlib import sha1
+from math import log
+from scipy import stats
+from FAdo.cfg import REStringRGenerator
+from utils import *
+from methods import *
+from converters import RegExpConverter
+
+
+BENCH_DIR = "bench"
+CORPUS_FILE = os.path.join(BENCH_DIR, "corpus.json")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+BASELINE_FORMAT = 4 # times per regexp, per word (of calls repeated up to min_seconds), and the automaton build & reduction times
+AUTOMATON_METHODS = [pddag_once, pddag_min, follow_once, follow_min] # see methods.py::automaton_stats
+
+
+def make_corpus(words_per_regexp: int):
+    """Generate one regexp of each configured length with up to `words_per_regexp` accepting
+    and as many rejecting words. Requires PICT
+    """
+    rnd = random.Random(1)
+    random.seed(1) # FAdo's generator uses the global random
+    corpus = list()
+    for length in config().gen.lengths:
+        generator = REStringRGenerator(Sigma=config().gen.alphabet, size=length,
+                                       epsilon=config().gen.epsilon, empty=config().gen.empty)
+        regexp = generator.generate()
+        while RegExpConverter.str_to_regexp(regexp).starHeight() > 2:
+            regexp = generator.generate()
+
+        tree = RegExpConverter.str_to_regexp(regexp, sigma=config().gen.alphabet)
+        accepted = pairwise_language_generation(RegExpConverter.str_to_sre(regexp),
+                                                max_timeout=config().max_pict_seconds)
+        rejected = sorted(find_rejected_words(tree.nfaPDDAG().evalWordP, accepted))
+        corpus.append({
+            "regexp": regexp,
+            "accepted": rnd.sample(accepted, min(words_per_regexp, len(accepted))),
+            "rejected": rnd.sample(rejected, min(words_per_regexp, len(rejected)))
+        })
+        print(str(length).ljust(6), len(corpus[-1]["accepted"]), len(corpus[-1]["rejected"]))
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    with open(CORPUS_FILE, "w") as handle:
+        json.dump(corpus, handle, indent=1)
+
+
+def time_word(method: Callable, tree: RegExp, word: str, min_seconds: float) -> tuple[bool, float]:
+    """The result and mean CPU time of deciding the word as many times as it takes to add up to
+    `min_seconds`. Note that pdcache's repeated calls find the word's derivatives cached"""
+    res, total = method(tree, word)
+    calls = 1
+    while total < min_seconds:
+        total += method(tree, word)[1]
+        calls += 1
+    return res, total / calls
+
+
+def time_automata(regexp: str, min_seconds: float) -> tuple[RegExp, dict[str, float]]:
+    """The mean CPU time of each of AUTOMATON_TIMES, building and reducing the automata of new
+    trees until every step adds up to `min_seconds`. Returns the last tree, whose automata are
+    built, and the times"""
+    totals = dict((key, 0.0) for key in AUTOMATON_TIMES)
+    calls = 0
+    while calls == 0 or min(totals.values()) < min_seconds:
+        tree = RegExpConverter.str_to_regexp(regexp, sigma=config().gen.alphabet)
+        built = automaton_stats(tree)
+        for key in AUTOMATON_TIMES:
+            totals[key] += built[key]
+        calls += 1
+    return tree, dict((key, total / calls) for key, total in totals.items())
+
+
+def run(corpus: list[dict], methods: list[Callable], repeats: int, automata: bool,
+        min_seconds: float) -> dict[str, list[list[float]]]:
+    """method name => per regexp, the fastest time of each word, in corpus order. With `automata`,
+    also AUTOMATON_TIMES => per regexp, the fastest build or reduction"""
+    times = dict((method.__name__, list()) for method in methods)
+    if automata:
+        times |= dict((key, list()) for key in AUTOMATON_TIMES)
+    for item in corpus:
+        words = [(w, True) for w in item["accepted"]] + [(w, False) for w in item["rejected"]]
+        best = dict((method.__name__, [float("inf")] * len(words)) for method in methods)
+        if automata:
+            best |= dict((key, [float("inf")]) for key in AUTOMATON_TIMES)
+
+        # the methods take turns, so a slow period of the machine is shared by all of them
+        for _ in range(repeats):
+            # every pass of pdcache starts cold, rather than warmed by earlier passes and regexps,
+            # and a new tree has its automata built and reduced again
+            DERIVATIVE_CACHE.clear()
+            if automata:
+                tree, built = time_automata(item["regexp"], min_seconds)
+                for key in AUTOMATON_TIMES:
+                    best[key][0] = min(best[key][0], built[key])
+            else:
+                tree = RegExpConverter.str_to_regexp(item["regexp"], sigma=config().gen.alphabet)
+            for method in methods:
+                for i, (w, expected) in enumerate(words):
+                    res, cpu_time = time_word(method, tree, w, min_seconds)
+                    assert res is expected, f"{item['regexp']} using {method.__name__} should"\
+                        f"{'' if expected else ' not'} have accepted {w}. Returned {res}"
+                    best[method.__name__][i] = min(best[method.__name__][i], cpu_time)
+
+        print("\t", str(regexp_length(item["regexp"])).ljust(5),
+              " ".join(f"{name}={sum(best[name]):.3f}" for name in best))
+        sys.stdout.flush()
+        for name in best:
+            times[name].append(best[name])
+    return times
+
+
+def fastest(a: dict[str, list[list[float]]], b: dict[str, list[list[float]]]) -> dict[str, list[list[float]]]:
+    """The fastest time of each word in either measurement of the methods (and automaton times) in `b`"""
+    return dict((name, [[min(x, y) for x, y in zip(ra, rb)] for ra, rb in zip(a[name], b[name])])
+                for name in b)
+
+
+def compare(baseline: dict[str, list[list[float]]], current: dict[str, list[list[float]]],
+            alpha: float, max_slowdown: float) -> list[str]:
+    """Print the comparison of each method. Returns the names of the regressed methods"""
+    regressed = list()
+    print("\n" + "method".ljust(14), "regexps".rjust(7), "baseline".rjust(10), "current".rjust(10),
+          "ratio".rjust(7), "p(slower)".rjust(10), "p(faster)".rjust(10))
+    for name in current:
+        if name not in baseline:
+            print(name.ljust(14), "not in the baseline")
+            continue
+
+        base = [sum(words) for words in baseline[name]]
+        cur = [sum(words) for words in current[name]]
+        ratio = sum(cur) / sum(base)
+        log_ratios = [log(max(c, 1e-9) / b) for b, c in zip(base, cur)]
+        p_slower = p_faster = 1.0
+        if any(r != 0 for r in log_ratios):
+            p_slower = stats.wilcoxon(log_ratios, alternative="greater").pvalue
+            p_faster = stats.wilcoxon(log_ratios, alternative="less").pvalue
+
+        verdict = ""
+        if 0.5 ** len(base) >= alpha:
+            # the smallest one-sided p-value of the exact test is 1/2^n
+            verdict = f"UNTESTED: too few regexps to be significant at {alpha}"
+        elif p_slower < alpha and ratio > 1 + max_slowdown:
+            verdict = "REGRESSION"
+            regressed.append(name)
+        elif p_faster < alpha and ratio < 1:
+            verdict = "improvement"
+        print(name.ljust(14), f"{len(base):7}", f"{sum(base):10.6f}", f"{sum(cur):10.6f}", f"{ratio:7.3f}",
+              f"{p_slower:10.4f}", f"{p_faster:10.4f}", verdict)
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Performance regression suite for the membership methods")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--make-corpus", action="store_true", help="regenerate the checked-in corpus")
+    parser.add_argument("--words", type=int, default=8, help="words of each kind per regexp (--make-corpus)")
+    parser.add_argument("--repeats", type=int, default=5, help="times each word is decided; the fastest is kept")
+    parser.add_argument("--alpha", type=float, default=0.05, help="significance level")
+    parser.add_argument("--max-slowdown", type=float, default=0.10,
+                        help="allowed slowdown of a method's total time")
+    parser.add_argument("--min-seconds", type=float, default=1e-4,
+                        help="a word is decided repeatedly until the calls take at least this long")
+    parser.add_argument("--methods", nargs="+", help="names of the methods to run (default: all)")
+    args = parser.parse_args()
+
+    if args.make_corpus:
+        make_corpus(args.words)
+        exit(0)
+
+    with open(CORPUS_FILE, "rb") as handle:
+        corpus_hash = sha1(handle.read()).hexdigest()
+    with open(CORPUS_FILE, "r") as handle:
+        corpus = json.load(handle)
+    methods = [method for method in METHODS if args.methods is None or method.__name__ in args.methods]
+
+    automata = any(method in AUTOMATON_METHODS for method in methods)
+
+    print(f"Running {', '.join(method.__name__ for method in methods)} on {len(corpus)} regexps")
+    current = run(corpus, methods, args.repeats, automata, args.min_seconds)
+
+    if args.save:
+        with open(BASELINE_FILE, "w") as handle:
+            json.dump({ "format": BASELINE_FORMAT, "corpus": corpus_hash, "repeats": args.repeats,
+                        "min_seconds": args.min_seconds, "times": current }, handle)
+        print(f"Saved the baseline to {BASELINE_FILE}")
+        exit(0)
+
+    if not os.path.exists(BASELINE_FILE):
+        print(f"There is no baseline to compare with. First you must 'python {sys.argv[0]} --save'")
+        exit(1)
+    with open(BASELINE_FILE, "r") as handle:
+        baseline = json.load(handle)
+    if baseline.get("format") != BASELINE_FORMAT:
+        print(f"The baseline was made by an older version of {sys.argv[0]}. Please re-run 'python {sys.argv[0]} --save'")
+        exit(1)
+    if baseline["corpus"] != corpus_hash:
+        print(f"The baseline was made with a different corpus. Please re-run 'python {sys.argv[0]} --save'")
+        exit(1)
+    if baseline["min_seconds"] != args.min_seconds:
+        print(f"The baseline was made with --min-seconds {baseline['min_seconds']}. Please use the same or re-run 'python {sys.argv[0]} --save'")
+        exit(1)
+
+    suspected = compare(baseline["times"], current, args.alpha, args.max_slowdown)
+    if len(suspected) > 0:
+        # a slow period of the machine can look like a regression, so measure the suspects again
+        print(f"\nMeasuring {', '.join(suspected)} again")
+        again = run(corpus, [method for method in methods if method.__name__ in suspected], args.repeats,
+                    any(key in suspected for key in AUTOMATON_TIMES), args.min_seconds)
+        regressed = compare(baseline["times"], fastest(current, again), args.alpha, args.max_slowdown)
+        if len(regressed) > 0:
+            print(f"\nSignificant regressions: {', '.join(regressed)}")
+            exit(1)
@@ -0,0 +1,104 @@
+"""Reduce an NFA by merging bisimilar states, which preserves its language.
+
+Forward bisimulation merges states with the same future: they agree on being final and, for
+every symbol, move to the same blocks of states. Backward bisimulation is the same on the
+reversed automaton (states with the same past). Merging by one can enable merging by the
+other, so they alternate until the automaton stops shrinking. Epsilon transitions are
+removed first, and states which are unreachable or cannot reach a final state are dropped.
+"""
+
+from FAdo.fa import NFA
+from nfa_words import epsilon_free
+
+
+_Delta = dict[int, dict[str, frozenset[int]]]
+
+def _refine(delta: _Delta, accepting: frozenset[int]) -> dict[int, int]:
+    """The coarsest partition (state => block) of the states which agree on `accepting` and,
+    for every symbol, on the blocks they move to
+    """
+    block = dict((s, int(s in accepting)) for s in delta)
+    nblocks = len(set(block.values()))
+    while True:
+        ids = dict()
+        refined = dict()
+        for s in delta:
+            signature = (block[s], frozenset((a, block[t]) for a, targets in delta[s].items() for t in targets))
+            refined[s] = ids.setdefault(signature, len(ids))
+        if len(ids) == nblocks:
+            return refined
+        block, nblocks = refined, len(ids)
+
+
+def _quotient(delta: _Delta, initial: frozenset[int], final: frozenset[int],
+              block: dict[int, int]) -> tuple[_Delta, frozenset[int], frozenset[int]]:
+    merged = dict((b, dict()) for b in set(block.values()))
+    for s in delta:
+        for a, targets in delta[s].items():
+            merged[block[s]][a] = merged[block[s]].get(a, frozenset()) | frozenset(block[t] for t in targets)
+    return merged, frozenset(block[s] for s in initial), frozenset(block[s] for s in final)
+
+
+def _reverse(delta: _Delta) -> _Delta:
+    reverse = dict((s, dict()) for s in delta)
+    for s in delta:
+        for a, targets in delta[s].items():
+            for t in targets:
+                reverse[t][a] = reverse[t].get(a, frozenset()) | {s}
+    return reverse
+
+
+def _reachable(delta: _Delta, start: frozenset[int]) -> set[int]:
+    seen = set(start)
+    stack = list(start)
+    while len(stack) > 0:
+        for targets in delta[stack.pop()].values():
+            for t in targets:
+                if t not in seen:
+                    seen.add(t)
+                    stack.append(t)
+    return seen
+
+
+def _trim(delta: _Delta, initial: frozenset[int], final: frozenset[int]) -> tuple[_Delta, frozenset[int], frozenset[int]]:
+    """Keep the states which are reachable and can reach a final state"""
+    useful = _reachable(delta, initial) & _reachable(_reverse(delta), final)
+    trimmed = dict()
+    for s in useful:
+        trimmed[s] = dict()
+        for a, targets in delta[s].items():
+            if len(targets & useful) > 0:
+                trimmed[s][a] = targets & useful
+    return trimmed, initial & useful, final & useful
+
+
+def size(nfa: NFA) -> tuple[int, int]:
+    """(number of states, number of transitions)"""
+    return len(nfa.States), sum(len(targets) for row in nfa.delta.values() for targets in row.values())
+
+
+def reduce_nfa(nfa: NFA) -> NFA:
+    delta, final = epsilon_free(nfa)
+    delta, initial, final = _trim(delta, frozenset(nfa.Initial), final)
+
+    while True:
+        nstates = len(delta)
+        delta, initial, final = _quotient(delta, initial, final, _refine(delta, final))
+        reverse = _reverse(delta)
+        delta, initial, final = _quotient(delta, initial, final, _refine(reverse, initial))
+        if len(delta) == nstates:
+            break
+
+    reduced = NFA()
+    reduced.setSigma(set(nfa.Sigma))
+    for s in range(len(delta)):
+        reduced.addState(s)
+    for s in initial:
+        reduced.addInitial(s)
+    for s in final:
+        reduced.addFinal(s)
+    for s in delta:
+        for a, targets in delta[s].items():
+            for t in targets:
+                reduced.addTransition(s, a, t)
+    return reduced
@@ -0,0 +1,85 @@
+"""Save the progress of benchmarking a single regular expression so an interrupted
+regexp (Ctrl+C or a dead node) resumes where it left off instead of starting over.
+
+A checkpoint holds the generated accepting and rejecting words, how many words have
+already been tested, the accumulated time of each method, and the wall time spent on the
+regexp so far (see scheduling.py). It is saved to
+`{data}/{checkpoints}/{sha1(regexp)}.json` after word generation and then periodically,
+and removed once the regexp's results are written to the output file.
+"""
+
+import os
+import json
+from hashlib import sha1
+from time import monotonic
+from utils import *
+
+
+class Checkpoint:
+    """The resumable state of benchmarking one regexp"""
+    def __init__(self, datadir: str, regexp: str):
+        self.regexp = regexp
+        self.fname = os.path.join(datadir, config().files.checkpoints,
+                                  sha1(regexp.encode("utf-8")).hexdigest() + ".json")
+        self.accepted: list[str]|None = None
+        self.rejected: list[str]|None = None
+        self.done = 0 # words tested: all of accepted come before rejected
+        self.times: dict[str, float] = dict() # OutputFileEntry.method_time_key(method) => time
+        self.elapsed = 0.0 # wall seconds spent on the regexp before it was interrupted
+        self.started = monotonic()
+        self.last_save = self.started
+
+    def load(self) -> bool:
+        """Restore the state from the checkpoint file. Returns if there was anything to restore"""
+        if not os.path.exists(self.fname):
+            return False
+
+        with open(self.fname, "r") as handle:
+            state = json.load(handle)
+        if state["regexp"] != self.regexp:
+            return False
+
+        self.accepted = state["accepted"]
+        self.rejected = state["rejected"]
+        self.done = state["done"]
+        self.times = state["times"]
+        self.elapsed = state.get("seconds", 0.0)
+        self.started = monotonic()
+        return True
+
+    def save(self, entry: OutputFileEntry|None=None):
+        """Write the state to the checkpoint file. The times are taken from `entry` if given"""
+        if entry is not None:
+            self.times = dict((OutputFileEntry.method_time_key(method), entry.get_time(method))
+                              for method in METHODS)
+
+        os.makedirs(os.path.dirname(self.fname), exist_ok=True)
+        tmpname = self.fname + ".tmp"
+        with open(tmpname, "w") as handle:
+            json.dump({
+                "regexp": self.regexp,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "done": self.done,
+                "times": self.times,
+                "seconds": self.seconds()
+            }, handle, separators=(",", ":"))
+        os.replace(tmpname, self.fname) # atomic, so a kill mid-write keeps the last checkpoint
+        self.last_save = monotonic()
+
+    def seconds(self) -> float:
+        """Wall seconds spent on the regexp, including before any interruptions"""
+        return self.elapsed + monotonic() - self.started
+
+    def due(self) -> bool:
+        """Has the configured checkpoint interval elapsed since the last save?"""
+        return monotonic() - self.last_save >= config().checkpoint_seconds
+
+    def restore_times(self, entry: OutputFileEntry):
+        """Copy the accumulated times into `entry`"""
+        for key, time in self.times.items():
+            setattr(entry, key, time)
+
+    def remove(self):
+        if os.path.exists(self.fname):
+            os.remove(self.fname)
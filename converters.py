@@ -1,6 +1,22 @@
+import os
+import lark
+import FAdo
 from FAdo.reex import *
 
 
+# FAdo's grammar only reads the symbols [a-zA-Z0-9]. For larger alphabets, the same grammar with
+# any Unicode letter or digit as a symbol (see `utils.alphabet`)
+with open(os.path.join(os.path.dirname(FAdo.__file__), "regexp_grammar.lark"), "r") as handle:
+    _unicodeGrammar = lark.Lark(handle.read().replace("symbol: /[a-zA-Z0-9]/", r"symbol: /[^\W_]/"),
+                                start="rege", parser="lalr")
+
+def _parse(builder: type, string: str, sigma) -> RegExp:
+    """As FAdo's str2regexp/str2sre, with the Unicode grammar"""
+    reg = builder(context={"sigma": sigma}).transform(_unicodeGrammar.parse(string))
+    reg.setSigma(reg.setOfSymbols() if sigma is None else sigma)
+    return reg
+
+
 class RegExpConverter:
     """This class defines methods that can be overridden and re-implemented to support the
     different conversions of `string <--> sre <--> regexp`
@@ -13,11 +29,15 @@ class RegExpConverter:
     @classmethod
     def str_to_regexp(cls, string: str, sigma=None) -> RegExp:
         """Convert a string into a standard RegExp with binary compositions"""
+        if not string.isascii():
+            return _parse(BuildRegexp, string, sigma)
         return str2regexp(string, sigma=sigma)
 
     @classmethod
     def str_to_sre(cls, string: str, sigma=None) -> RegExp:
         """Convert a string into a special RegExp with higher dimensionality"""
+        if not string.isascii():
+            return _parse(BuildSRE, string, sigma)
         return str2sre(string, sigma=sigma)
 
     @classmethod
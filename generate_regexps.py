@@ -6,7 +6,7 @@ $ python generate_regexps.py data
 import os
 import sys
 from FAdo.cfg import REStringRGenerator
-from utils import config, get_output_dir
+from utils import alphabet, config, get_output_dir
 from converters import RegExpConverter
 
 
@@ -20,7 +20,8 @@ if __name__ == "__main__":
         exit(1)
 
     print(f"Generating {config().gen.per_length} for each length {config().gen.lengths}")
-    print(f"Over the alphabet: {config().gen.alphabet}\n")
+    print(f"Over the alphabet: {''.join(alphabet(min(config().gen.alphabet_size, 62)))}"
+          f"{'...' if config().gen.alphabet_size > 62 else ''} ({config().gen.alphabet_size} symbols)\n")
 
     if not os.path.exists(datadir): os.mkdir(datadir)
     with open(regexps_file, "w") as handle:
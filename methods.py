@@ -3,8 +3,10 @@
 save_pdkey() -> Recursively compute and save a unique key for each regexp
                 as the attribute "pdkey"
 keyed_pds() -> KeyedSet of partial derivatives
+cached_pds() -> tuple of partial derivatives, shared through DERIVATIVE_CACHE
 """
 
+from collections import OrderedDict
 from FAdo.reex import *
 
 class KeyedSet:
@@ -21,6 +23,9 @@ class KeyedSet:
     def __iter__(self):
         return iter(self.set)
 
+    def __len__(self):
+        return len(self.set)
+
     def add(self, obj):
         before = len(self.keys)
         self.keys.add(getattr(obj, self.key))
@@ -123,6 +128,118 @@ CDisj.keyed_pds = PD.disj
 CStar.keyed_pds = PD.star
 
 
+class DerivativeCache:
+    """A size-bounded (least recently used) cache of (pdkey, symbol) => partial derivatives.
+    Subexpressions are identified by their pdkey, so equal subexpressions of different regexps
+    share an entry for as long as the process lives
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple[str, str], tuple[RegExp, ...]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple[str, str]) -> tuple[RegExp, ...]|None:
+        pds = self.entries.get(key)
+        if pds is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return pds
+
+    def put(self, key: tuple[str, str], pds: tuple[RegExp, ...]):
+        self.entries[key] = pds
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry (the hit & miss counts are kept)"""
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "hit_rate": self.hits / lookups if lookups > 0 else None
+        }
+
+# one per process: the benchmark workers are long-lived, so it persists across regexps.
+# run_benchmarks.py sets the size from the config
+DERIVATIVE_CACHE = DerivativeCache(100_000)
+
+
+class CachedPD:
+    """Like PD, but the partial derivatives of every subexpression are looked up in (and
+    added to) DERIVATIVE_CACHE. Cached results are shared, so they are immutable tuples
+    """
+    def lookup(self, symbol):
+        key = (self.pdkey, symbol)
+        pds = DERIVATIVE_CACHE.get(key)
+        if pds is None:
+            pds = tuple(self.uncached_pds(symbol))
+            DERIVATIVE_CACHE.put(key, pds)
+        return pds
+
+    # SIMPLE CASES
+    def atom(self, symbol):
+        return PD.atom(self, symbol)
+
+    def epsilon(self, symbol):
+        return ()
+
+    def emptyset(self, symbol):
+        return ()
+
+    # COMPOSITE CASES
+    def concat(self, symbol):
+        pds = KeyedSet("pdkey")
+        for pd in self.arg1.cached_pds(symbol):
+            if pd.emptysetP():
+                pass
+            elif pd.epsilonP():
+                pds.add(self.arg2)
+            else:
+                new_pd = CConcat(pd, self.arg2, self.Sigma)
+                new_pd.pdkey = f".{pd.pdkey}{self.arg2.pdkey}"
+                pds.add(new_pd)
+        if self.arg1.ewp():
+            for pd in self.arg2.cached_pds(symbol):
+                pds.add(pd)
+        return pds
+
+    def disj(self, symbol):
+        pds = KeyedSet("pdkey", self.arg1.cached_pds(symbol))
+        for pd in self.arg2.cached_pds(symbol):
+            pds.add(pd)
+        return pds
+
+    def star(self, symbol):
+        pds = KeyedSet("pdkey")
+        for pd in self.arg.cached_pds(symbol):
+            if pd.emptysetP():
+                pass
+            elif pd.epsilonP():
+                pds.add(self)
+            else:
+                new_pd = CConcat(pd, self, self.Sigma)
+                # the key of the star itself: a cached entry must not be shared with `pd self.arg`
+                new_pd.pdkey = f".{pd.pdkey}{self.pdkey}"
+                pds.add(new_pd)
+        return pds
+
+CAtom.cached_pds = CEpsilon.cached_pds = CEmptySet.cached_pds = CachedPD.lookup
+CConcat.cached_pds = CDisj.cached_pds = CStar.cached_pds = CachedPD.lookup
+CAtom.uncached_pds = CachedPD.atom
+CEpsilon.uncached_pds = CachedPD.epsilon
+CEmptySet.uncached_pds = CachedPD.emptyset
+CConcat.uncached_pds = CachedPD.concat
+CDisj.uncached_pds = CachedPD.disj
+CStar.uncached_pds = CachedPD.star
+
+
 
 
 
@@ -138,6 +255,8 @@ from copy import deepcopy
 from functools import wraps
 from time import process_time
 from FAdo.reex import RegExp
+from FAdo.fa import NFA
+from bisimulation import reduce_nfa, size
 
 def timer(func):
     @wraps(func)
@@ -196,10 +315,81 @@ def pdfast(tree: RegExp, word: str) -> bool:
         current = next
     return any(map(lambda pd: pd.ewp(), current))
 
+@timer
+def pdcache(tree: RegExp, word: str) -> bool:
+    """Like pdfast, but the partial derivatives of subexpressions are shared with earlier
+    words and regexps through the worker's DERIVATIVE_CACHE"""
+    tree = deepcopy(tree) # deepcopied so attribute `pdkey` is not created on the passed regexp
+    tree.save_pdkey()
+    current = KeyedSet("pdkey", [tree])
+    for symbol in word:
+        next = KeyedSet("pdkey")
+        for re in current:
+            for pd in re.cached_pds(symbol):
+                next.add(pd)
+        current = next
+    return any(map(lambda pd: pd.ewp(), current))
+
 @timer
 def follow(tree: RegExp, word: str) -> bool:
     """Follow construction then evaluate NFA membership. This has experimentally been proven to be fast"""
     return tree.nfaFollow().evalWordP(word)
 
 
-METHODS = [Derivative, pddag, pdset, pdlist, pdfast, follow]
\ No newline at end of file
+# automaton name => (tree, automaton, reduced automaton, build seconds, reduce seconds). Only the
+# latest tree is kept, and it is matched by identity rather than kept on the tree, since other
+# methods deepcopy the tree
+_automata: dict[str, tuple[RegExp, NFA, NFA, float, float]] = dict()
+
+def built_automaton(tree: RegExp, name: str) -> tuple[NFA, NFA, float, float]:
+    """The "pddag" or "follow" automaton of the tree, its reduction by bisimulation, and the CPU
+    time taken by each, built once per tree. The benchmarks build them with automaton_stats
+    before timing the words, so pddag_once, pddag_min, follow_once, and follow_min time the
+    membership alone"""
+    if name not in _automata or _automata[name][0] is not tree:
+        ti = process_time()
+        nfa = tree.nfaPDDAG() if name == "pddag" else tree.nfaFollow()
+        tm = process_time()
+        reduced = reduce_nfa(nfa)
+        tf = process_time()
+        _automata[name] = (tree, nfa, reduced, tm - ti, tf - tm)
+    return _automata[name][1:]
+
+@timer
+def pddag_once(tree: RegExp, word: str) -> bool:
+    """Like pddag, but on the automaton built once per regexp. The baseline for pddag_min"""
+    return built_automaton(tree, "pddag")[0].evalWordP(word)
+
+@timer
+def pddag_min(tree: RegExp, word: str) -> bool:
+    """Like pddag_once, but on the automaton reduced by bisimulation"""
+    return built_automaton(tree, "pddag")[1].evalWordP(word)
+
+@timer
+def follow_once(tree: RegExp, word: str) -> bool:
+    """Like follow, but on the automaton built once per regexp. The baseline for follow_min"""
+    return built_automaton(tree, "follow")[0].evalWordP(word)
+
+@timer
+def follow_min(tree: RegExp, word: str) -> bool:
+    """Like follow_once, but on the automaton reduced by bisimulation"""
+    return built_automaton(tree, "follow")[1].evalWordP(word)
+
+AUTOMATON_SIZES = [f"{kind}4{name}" for name in ["pddag", "pddag_min", "follow", "follow_min"]
+                   for kind in ["states", "transitions"]]
+AUTOMATON_TIMES = [f"{kind}4{name}" for name in ["pddag", "follow"] for kind in ["build", "reduce"]]
+
+def automaton_stats(tree: RegExp) -> dict[str, int|float]:
+    """The number of states & transitions of the automata before and after reduction (see
+    AUTOMATON_SIZES), and the CPU time taken to build and to reduce them (see AUTOMATON_TIMES)"""
+    stats = dict()
+    for name in ["pddag", "follow"]:
+        nfa, reduced, build_seconds, reduce_seconds = built_automaton(tree, name)
+        stats[f"states4{name}"], stats[f"transitions4{name}"] = size(nfa)
+        stats[f"states4{name}_min"], stats[f"transitions4{name}_min"] = size(reduced)
+        stats[f"build4{name}"], stats[f"reduce4{name}"] = build_seconds, reduce_seconds
+    return stats
+
+
+METHODS = [Derivative, pddag, pddag_once, pddag_min, pdset, pdlist, pdfast, pdcache, follow, follow_once,
+           follow_min]
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""Generate words of bounded length directly from an NFA (e.g., the follow automaton).
+
+The core is a table `reach[k]`: the set of states from which a final state can be reached
+in exactly k steps. With it, a word of length n is built symbol by symbol and only symbols
+which can still complete a word of exactly n symbols are followed, so enumeration never
+visits a dead end and finding the next word costs O(n |Sigma|) state-set steps.
+
+`reach[k+1]` depends only on `reach[k]`, so the sequence is eventually periodic. Only the
+prefix up to the first repeated set is stored, which makes very long words (e.g., a million
+symbols for random walks) as cheap to generate as short ones.
+"""
+
+import random
+from itertools import islice
+from typing import Iterator
+from FAdo.reex import Epsilon
+from FAdo.fa import NFA
+
+
+def _closure(nfa: NFA, state: int) -> frozenset[int]:
+    closure = {state}
+    stack = [state]
+    while len(stack) > 0:
+        for t in nfa.delta.get(stack.pop(), dict()).get(Epsilon, ()):
+            if t not in closure:
+                closure.add(t)
+                stack.append(t)
+    return frozenset(closure)
+
+
+def epsilon_free(nfa: NFA) -> tuple[dict[int, dict[str, frozenset[int]]], frozenset[int]]:
+    """Remove the epsilon transitions of an NFA (the follow automaton may have some) by following
+    the epsilon closure before and after each symbol. The initial states are unchanged.
+    Returns (state => symbol => next states, final states)
+    """
+    closure = dict((state, _closure(nfa, state)) for state in range(len(nfa.States)))
+    delta = dict()
+    for state in range(len(nfa.States)):
+        delta[state] = dict()
+        for symbol in nfa.Sigma:
+            if symbol == Epsilon:
+                continue
+            targets = set()
+            for p in closure[state]:
+                for t in nfa.delta.get(p, dict()).get(symbol, ()):
+                    targets.update(closure[t])
+            if len(targets) > 0:
+                delta[state][symbol] = frozenset(targets)
+    final = frozenset(state for state in closure if not closure[state].isdisjoint(nfa.Final))
+    return delta, final
+
+
+class BoundedWordEnumerator:
+    """Enumerate the words of an NFA's language up to `max_length` symbols"""
+    def __init__(self, nfa: NFA, max_length: int):
+        self.max_length = max_length
+        self.alphabet = sorted(symbol for symbol in nfa.Sigma if symbol != Epsilon)
+        self.initial = frozenset(nfa.Initial)
+
+        self.delta, final = epsilon_free(nfa)
+
+        # reach[k] = states which can reach a final state in exactly k steps
+        predecessors = dict((state, set()) for state in self.delta)
+        for state in self.delta:
+            for targets in self.delta[state].values():
+                for t in targets:
+                    predecessors[t].add(state)
+        self.reach = [final]
+        self.period_start = None
+        self.period = None
+        seen = { final: 0 }
+        while len(self.reach) <= max_length:
+            reach = frozenset(p for t in self.reach[-1] for p in predecessors[t])
+            if reach in seen:
+                self.period_start = seen[reach]
+                self.period = len(self.reach) - seen[reach]
+                break
+            seen[reach] = len(self.reach)
+            self.reach.append(reach)
+
+        # (states, index of reach[remaining - 1]) => successors, since the same state sets recur
+        self._memo: dict[tuple[frozenset[int], int], list[tuple[str, frozenset[int]]]] = dict()
+
+    def _index(self, k: int) -> int:
+        """The index into `self.reach` of reach[k]"""
+        if k < len(self.reach):
+            return k
+        return self.period_start + (k - self.period_start) % self.period
+
+    def reach_at(self, k: int) -> frozenset[int]:
+        """The states which can reach a final state in exactly k steps"""
+        return self.reach[self._index(k)]
+
+    def lengths(self) -> list[int]:
+        """Every length (up to max_length) which has at least one word in the language"""
+        return [k for k in range(self.max_length + 1) if not self.initial.isdisjoint(self.reach_at(k))]
+
+    def nearest_length(self, length: int) -> int|None:
+        """The smallest length >= `length` (up to max_length) which has a word in the language"""
+        for k in range(length, min(length + len(self.reach), self.max_length) + 1):
+            if not self.initial.isdisjoint(self.reach_at(k)):
+                return k
+        return None
+
+    def _successors(self, states: frozenset[int], remaining: int,
+                    rnd: random.Random|None) -> list[tuple[str, frozenset[int]]]:
+        """The (symbol, next states) which can still end in a final state after `remaining` symbols.
+        Next states are restricted to those which can; the rest cannot contribute a word
+        """
+        key = (states, self._index(remaining - 1))
+        successors = self._memo.get(key)
+        if successors is None:
+            successors = list()
+            useful = self.reach[key[1]]
+            for symbol in self.alphabet:
+                targets = frozenset(t for s in states for t in self.delta[s].get(symbol, ()) if t in useful)
+                if len(targets) > 0:
+                    successors.append((symbol, targets))
+            self._memo[key] = successors
+
+        if rnd is not None:
+            successors = successors.copy()
+            rnd.shuffle(successors)
+        return successors
+
+    def words(self, length: int, rnd: random.Random|None=None) -> Iterator[str]:
+        """Lazily yield the distinct words of exactly `length` symbols.
+        Lexicographic order, or a random order of the symbols at each position if `rnd` is given
+        """
+        if length > self.max_length or self.initial.isdisjoint(self.reach_at(length)):
+            return
+        if length == 0:
+            yield ""
+            return
+
+        prefix = list()
+        stack = [iter(self._successors(self.initial & self.reach_at(length), length, rnd))]
+        while len(stack) > 0:
+            step = next(stack[-1], None)
+            if step is None:
+                stack.pop()
+                if len(prefix) > 0:
+                    prefix.pop()
+                continue
+
+            symbol, targets = step
+            prefix.append(symbol)
+            if len(prefix) == length:
+                yield "".join(prefix)
+                prefix.pop()
+            else:
+                stack.append(iter(self._successors(targets, length - len(prefix), rnd)))
+
+    def random_walk(self, length: int, rnd: random.Random) -> str|None:
+        """A random accepted word of exactly `length` symbols, or None if there is none.
+        Unlike `words` nothing is kept to backtrack with, so the memory used is the word itself
+        """
+        if length > self.max_length:
+            return None
+        states = self.initial & self.reach_at(length)
+        if len(states) == 0:
+            return None
+
+        word = list()
+        for remaining in range(length, 0, -1):
+            symbol, states = rnd.choice(self._successors(states, remaining, None))
+            word.append(symbol)
+        return "".join(word)
+
+    def pick(self, length: int, k: int, rnd: random.Random) -> list[str]:
+        """Up to k distinct words of exactly `length` symbols: all of them if there are no more
+        than k, otherwise random walks (rather than the first words in order, which only differ
+        in their last symbols)
+        """
+        first = list(islice(self.words(length), k + 1))
+        if len(first) <= k:
+            return first
+
+        picked = dict() # distinct, in the order found
+        for _ in range(20 * k):
+            if len(picked) == k:
+                break
+            picked.setdefault(self.random_walk(length, rnd))
+        for word in first: # a few words can be so likely that the walks rarely find others
+            if len(picked) == k:
+                break
+            picked.setdefault(word)
+        return list(picked)
+
+    def sample(self, n: int, per_length: int, rnd: random.Random) -> Iterator[str]:
+        """Yield up to n words in length order, stratified across the lengths: when there are
+        more lengths than n, n lengths are spread evenly over the range, and each chosen length
+        first contributes an equal share of at most `per_length` words. The quota which is left
+        over (by lengths with fewer words, or by the cap) is shared by the lengths which have
+        more words, until there are n words or every chosen length is exhausted
+        """
+        lengths = self.lengths()
+        if len(lengths) == 0 or n <= 0:
+            return
+        if len(lengths) > n:
+            lengths = [lengths[i * len(lengths) // n] for i in range(n)]
+
+        picked = dict((length, list()) for length in lengths)
+        unexhausted = list(lengths) # lengths which may have more words
+        cap = per_length
+        while len(unexhausted) > 0:
+            remaining = n - sum(len(words) for words in picked.values())
+            if remaining <= 0:
+                break
+            shares = [min(cap, remaining // len(unexhausted) + (1 if i < remaining % len(unexhausted) else 0))
+                      for i in range(len(unexhausted))]
+            for length, share in list(zip(unexhausted, shares)):
+                if share == 0:
+                    continue
+                words = self.pick(length, len(picked[length]) + share, rnd)
+                if len(words) < len(picked[length]) + share:
+                    unexhausted.remove(length)
+                picked[length] = words
+            cap = n
+
+        for length in lengths:
+            yield from picked[length]
@@ -0,0 +1,296 @@
+"""A columnar, append-only store of the benchmark results and an incrementally updated
+aggregate of it for the analysis.
+
+The store is a directory with one raw binary file per numeric column of
+`OutputFileEntry` (`{column}.bin`, read with numpy), one text file per string column
+(`{column}.txt`, one value per line), and `schema.json` recording the column types.
+Appending a row appends to every column file under an exclusive lock, since multiple
+workers finish at the same time.
+
+Rows imported from an output file written before some columns existed (e.g., a method
+added since) hold NaN in those float columns and -1 in those int columns, rather than the
+defaults of OutputFileEntry, which would read as measurements.
+
+The aggregate keeps, for every (column, regexp length) bucket, the count, mean, and
+sum of squared deviations (M2) of the per-word times, leaving out the NaN values. It is cached in `aggregate.npz`
+together with the number of rows already processed, so re-running the analysis only
+reads and merges the rows appended since.
+
+Convert an existing output file into a store with:
+$ python results.py data
+"""
+
+import os
+import json
+import fcntl
+from statistics import NormalDist
+import numpy as np
+from utils import *
+
+
+_DTYPES = { int: "<i8", float: "<f8" }
+_MISSING = { "<i8": -1, "<f8": float("nan") } # numeric columns which an imported row never measured
+
+def _columns() -> dict[str, str]:
+    """column => numpy dtype string, or "str" for text columns, of an OutputFileEntry"""
+    return dict((prop, _DTYPES.get(OutputFileEntry.__annotations__[prop], "str"))
+                for prop in OutputFileEntry.properties())
+
+def _per_word_columns() -> list[str]:
+    """The columns which are averaged per word in the aggregate"""
+    return [OutputFileEntry.method_time_key(method) for method in METHODS]
+
+
+class ResultsStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.schema_file = os.path.join(directory, "schema.json")
+        self.cache_file = os.path.join(directory, "aggregate.npz")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.schema_file)
+
+    def schema(self) -> dict[str, str]:
+        """column => numpy dtype string, or "str" for text columns"""
+        with open(self.schema_file, "r") as handle:
+            return json.load(handle)
+
+    def _path(self, column: str, dtype: str) -> str:
+        return os.path.join(self.directory, column + (".txt" if dtype == "str" else ".bin"))
+
+    def _lock(self):
+        """An exclusive lock on the store, released when the returned file is closed"""
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, ".lock"), "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def append(self, entry: OutputFileEntry):
+        """Append one row. The store is created with the columns of `entry` if it doesn't exist"""
+        with self._lock():
+            self._append(entry)
+
+    def compatible(self) -> bool:
+        """Can rows of the current OutputFileEntry columns be appended? (e.g., not if METHODS changed)"""
+        return not self.exists() or self.schema() == _columns()
+
+    def _append(self, entry: OutputFileEntry, missing: set[str]=set()):
+        """Append one row, writing the `missing` columns as not measured (see _MISSING)"""
+        expected = _columns()
+        if not self.exists():
+            with open(self.schema_file, "w") as handle:
+                json.dump(expected, handle, indent=2)
+        elif self.schema() != expected:
+            raise Exception(f"The columns of {self.directory} do not match the OutputFileEntry. "
+                            "Please rename or delete it to start a new store.")
+
+        for column, dtype in expected.items():
+            if dtype == "str":
+                with open(self._path(column, dtype), "a") as handle:
+                    handle.write(str(getattr(entry, column)).replace("\n", " ") + "\n")
+            else:
+                value = _MISSING[dtype] if column in missing else getattr(entry, column)
+                with open(self._path(column, dtype), "ab") as handle:
+                    handle.write(np.array([value], dtype=dtype).tobytes())
+
+    def nrows(self) -> int:
+        """The number of complete rows (an interrupted append may have written only some columns)"""
+        if not self.exists():
+            return 0
+        counts = []
+        for column, dtype in self.schema().items():
+            if dtype != "str":
+                path = self._path(column, dtype)
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                counts.append(size // np.dtype(dtype).itemsize)
+        return min(counts, default=0)
+
+    def read(self, columns: list[str], start: int=0, stop: int|None=None) -> dict[str, np.ndarray]:
+        """Read rows [start, stop) of the numeric columns"""
+        schema = self.schema()
+        stop = self.nrows() if stop is None else stop
+        data = dict()
+        for column in columns:
+            dtype = np.dtype(schema[column])
+            data[column] = np.fromfile(self._path(column, schema[column]), dtype=dtype,
+                                       count=max(0, stop - start), offset=start * dtype.itemsize)
+        return data
+
+    def aggregate(self) -> "Aggregate":
+        """The aggregate of all rows, updated from the cache with only the new rows"""
+        columns = [column for column in _per_word_columns() if column in self.schema()]
+        agg = Aggregate.load(self.cache_file, columns)
+        nrows = self.nrows()
+        if agg is None or agg.offset > nrows:
+            agg = Aggregate(columns)
+
+        if agg.offset < nrows:
+            data = self.read(columns + ["length", "nwords_acc", "nwords_rej", "avg_word_length"],
+                             start=agg.offset, stop=nrows)
+            nwords = data["nwords_acc"] + data["nwords_rej"]
+            batch = dict((column, data[column] / nwords) for column in columns) # average time per word
+            batch["avg_word_length"] = data["avg_word_length"]
+            agg.update(data["length"], batch)
+            agg.offset = nrows
+            agg.save(self.cache_file)
+
+        return agg
+
+    def read_text(self, column: str, stop: int|None=None) -> list[str]:
+        """Read rows [0, stop) of a text column"""
+        stop = self.nrows() if stop is None else stop
+        with open(self._path(column, "str"), "r") as handle:
+            return [line.removesuffix("\n") for _, line in zip(range(stop), handle)]
+
+    def aggregate_ranked(self, ranks: dict[str, int], n: int) -> "Aggregate":
+        """The aggregate of only the rows of the regexps ranked below `n` (e.g., the first `n`
+        regexps of each length in some order), each regexp once (not cached)
+        """
+        columns = [column for column in _per_word_columns() if column in self.schema()]
+        data = self.read(columns + ["length", "nwords_acc", "nwords_rej", "avg_word_length"])
+
+        first = np.zeros(len(data["length"]), dtype=bool)
+        seen = set()
+        for i, regexp in enumerate(self.read_text("regexp", len(first))):
+            if ranks.get(regexp, n) < n and regexp not in seen:
+                first[i] = True
+                seen.add(regexp)
+
+        nwords = data["nwords_acc"][first] + data["nwords_rej"][first]
+        batch = dict((column, data[column][first] / nwords) for column in columns)
+        batch["avg_word_length"] = data["avg_word_length"][first]
+        agg = Aggregate(columns)
+        agg.update(data["length"][first], batch)
+        return agg
+
+    def import_json(self, output_file: str):
+        """Append every entry of a json lines output file"""
+        with self._lock():
+            self._import_json(output_file)
+
+    def _import_json(self, output_file: str):
+        columns = set(_columns())
+        with open(output_file, "r") as handle:
+            for line in handle:
+                values = json.loads(line)
+                self._append(OutputFileEntry(**values), columns - set(values))
+
+    def sync(self, output_file: str) -> bool:
+        """Create the store from the json lines output file if it doesn't exist yet (e.g., in a
+        data directory from before the store). Returns if the store holds as many rows as the
+        output file, since a resumed run appends to both
+        """
+        with self._lock():
+            if not self.exists() and os.path.exists(output_file):
+                self._import_json(output_file)
+
+            nlines = 0
+            if os.path.exists(output_file):
+                with open(output_file, "r") as handle:
+                    nlines = sum(1 for _ in handle)
+            return self.nrows() == nlines
+
+
+class Aggregate:
+    """Per regexp length: the number of rows, and per column the count of measured (not NaN)
+    values, their mean (NaN if there are none), and M2 (sum of squared deviations).
+    Batches are merged with the parallel variance algorithm of Chan et al.
+    """
+    def __init__(self, columns: list[str]):
+        self.columns = columns
+        self.offset = 0 # rows of the store already aggregated
+        self.lengths = np.zeros(0, dtype="<i8")
+        self.n = np.zeros(0, dtype="<i8")
+        self.count = dict((column, np.zeros(0, dtype="<i8")) for column in columns + ["avg_word_length"])
+        self.mean = dict((column, np.zeros(0)) for column in columns + ["avg_word_length"])
+        self.m2 = dict((column, np.zeros(0)) for column in columns + ["avg_word_length"])
+
+    def update(self, lengths: np.ndarray, batch: dict[str, np.ndarray]):
+        """Merge a batch of rows (regexp length and the value of each column)"""
+        all_lengths = np.union1d(self.lengths, lengths)
+        old = np.searchsorted(all_lengths, self.lengths)
+        idx = np.searchsorted(all_lengths, lengths)
+
+        n = np.zeros(len(all_lengths), dtype="<i8")
+        n[old] = self.n
+        self.n = n + np.bincount(idx, minlength=len(all_lengths))
+
+        for column, values in batch.items():
+            measured = ~np.isnan(values)
+            values, at = values[measured], idx[measured]
+
+            na = np.zeros(len(all_lengths), dtype="<i8")
+            mean_a = np.zeros(len(all_lengths))
+            m2_a = np.zeros(len(all_lengths))
+            na[old] = self.count[column]
+            mean_a[old] = np.nan_to_num(self.mean[column])
+            m2_a[old] = self.m2[column]
+
+            nb = np.bincount(at, minlength=len(all_lengths))
+            n = na + nb
+            mean_b = np.bincount(at, weights=values, minlength=len(all_lengths)) / np.maximum(nb, 1)
+            m2_b = np.bincount(at, weights=(values - mean_b[at]) ** 2, minlength=len(all_lengths))
+
+            delta = mean_b - mean_a
+            self.count[column] = n
+            self.mean[column] = np.where(n > 0, mean_a + delta * nb / np.maximum(n, 1), np.nan)
+            self.m2[column] = m2_a + m2_b + delta ** 2 * na * nb / np.maximum(n, 1)
+
+        self.lengths = all_lengths
+
+    def stdev(self, column: str) -> np.ndarray:
+        """Sample standard deviation of a column per length"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.count[column] > 1, np.sqrt(self.m2[column] / (self.count[column] - 1)), np.nan)
+
+    def relative_half_width(self, column: str, confidence: float) -> np.ndarray:
+        """Half-width of the normal approximation confidence interval of the mean per length,
+        as a fraction of the mean
+        """
+        z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return z * self.stdev(column) / np.sqrt(self.count[column]) / np.abs(self.mean[column])
+
+    def save(self, fname: str):
+        arrays = { "offset": np.array(self.offset), "lengths": self.lengths, "n": self.n }
+        for column in self.mean:
+            arrays[f"count:{column}"] = self.count[column]
+            arrays[f"mean:{column}"] = self.mean[column]
+            arrays[f"m2:{column}"] = self.m2[column]
+        with open(fname + ".tmp", "wb") as handle:
+            np.savez(handle, **arrays)
+        os.replace(fname + ".tmp", fname)
+
+    @staticmethod
+    def load(fname: str, columns: list[str]) -> "Aggregate|None":
+        """Load the cached aggregate, or None if missing or made for different columns"""
+        if not os.path.exists(fname):
+            return None
+
+        agg = Aggregate(columns)
+        with np.load(fname) as arrays:
+            if set(agg.mean) != set(key.removeprefix("mean:") for key in arrays.files if key.startswith("mean:")):
+                return None
+            if "count:avg_word_length" not in arrays.files:
+                return None # made before the counts of measured values were kept
+            agg.offset = int(arrays["offset"])
+            agg.lengths = arrays["lengths"]
+            agg.n = arrays["n"]
+            for column in agg.mean:
+                agg.count[column] = arrays[f"count:{column}"]
+                agg.mean[column] = arrays[f"mean:{column}"]
+                agg.m2[column] = arrays[f"m2:{column}"]
+        return agg
+
+
+if __name__ == "__main__":
+    datadir = get_output_dir()
+    output_file = os.path.join(datadir, config().files.data_output)
+    store = ResultsStore(os.path.join(datadir, config().files.data_columns))
+
+    if store.exists():
+        print(f"{store.directory} already exists. Please rename or delete it first.")
+        exit(1)
+
+    store.import_json(output_file)
+    print(f"Imported {store.nrows()} rows from {output_file} into {store.directory}")
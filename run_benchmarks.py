@@ -2,84 +2,420 @@
 1. Find a regular expression
 2. Generate accepting words
 3. Delete characters from accepting words to make rejecting words
-4. Measure the time it takes each method to accept & reject each word
+4. Measure the time it takes each method to accept & reject each word (optionally split into
+   chunks of words, which are timed by different workers and then merged)
 5. Output the results to an output file for later analysis
 
 $ python run_benchmarks.py data
 """
 
-from time import sleep, strftime
+from time import sleep, process_time, monotonic
+from statistics import fmean
+from math import e, log
 import os
+import random
 import shutil
-from multiprocessing import Process
+import signal
+import traceback
+import numpy as np
+from itertools import count
+from queue import Empty
+from multiprocessing import Pool, Queue, queues
+from multiprocessing.pool import AsyncResult
 from utils import *
 from methods import *
 from converters import RegExpConverter
+from scheduling import CostModel, structural_cost
+from checkpoint import Checkpoint
+from telemetry import Telemetry, Dashboard
+from results import ResultsStore
+from alphabet_classes import AlphabetCompression
 
 
-def benchmark_regexp(regexp: str, datadir: str):
-    # logging
-    logfilename = f"tmp/{os.getpid()}.log"
-    logfile = open(logfilename, "w")
-    def writelog(*args, sep=" ", end="\n"):
-        logfile.write(sep.join(str(arg) for arg in args) + end)
-        logfile.flush()
-    print("\t", strftime("%H:%M:%S"), regexp)
-    writelog(strftime("%H:%M:%S") + ": REGEXP:", regexp, "\n========")
+def prepare_words(regexp: str, datadir: str, telemetry: Telemetry) -> Checkpoint:
+    """Generate the accepting & rejecting words, or resume them from the checkpoint if the regexp
+    was interrupted before. Returns the (saved) checkpoint
+    """
+    checkpoint = Checkpoint(datadir, regexp)
+    checkpoint.load()
+    if checkpoint.accepted is None:
+        telemetry.phase("pict")
+        checkpoint.accepted = pairwise_language_generation(RegExpConverter.str_to_sre(regexp),
+                                                           max_timeout=config().max_pict_seconds)
+        checkpoint.save()
+    if checkpoint.rejected is None:
+        telemetry.phase("rejection")
+        tree = RegExpConverter.str_to_regexp(regexp, sigma=config().gen.alphabet)
+        checkpoint.rejected = list(find_rejected_words(tree.nfaPDDAG().evalWordP, checkpoint.accepted))
+        checkpoint.save()
+    return checkpoint
 
-    # prepare the tests
+
+def compile_tree(regexp: str) -> tuple[RegExp, Callable[[str], str]]:
+    """The tree the methods are given, and the translation of the words they decide"""
     tree = RegExpConverter.str_to_regexp(regexp, sigma=config().gen.alphabet)
-    writelog(strftime("%H:%M:%S") + ": Generating accepting words ... ")
-    accepted = list(pairwise_language_generation(RegExpConverter.str_to_sre(regexp),
-                                                max_timeout=config().max_pict_seconds))
-    writelog(strftime("%H:%M:%S") + ": Done " + str(len(accepted)))
-    writelog(strftime("%H:%M:%S") + ": Generating rejecting words ... ")
-    rejected = list(find_rejected_words(tree.nfaPDDAG().evalWordP, accepted))
-    writelog(strftime("%H:%M:%S") + ": Done " + str(len(rejected)) + "\n")
 
-    nwords = len(accepted) + len(rejected)
-    entry = OutputFileEntry(
+    # the methods decide the words over the symbol classes (translated once) instead
+    if config().alphabet_compression:
+        compression = AlphabetCompression(tree)
+        return compression.tree, compression.translate
+    return tree, lambda w: w
+
+
+def new_entry(regexp: str, accepted: list[str], rejected: list[str]) -> OutputFileEntry:
+    return OutputFileEntry(
         regexp=regexp,
-        length=len(regexp.replace(Epsilon, "@").replace(EmptySet, "@")),
+        length=regexp_length(regexp),
         nwords_acc=len(accepted),
         nwords_rej=len(rejected),
-        avg_word_length=(sum(map(lambda w: len(w), accepted)) + sum(map(lambda w: len(w), rejected))) / nwords
+        avg_word_length=(sum(map(lambda w: len(w), accepted)) + sum(map(lambda w: len(w), rejected)))
+            / (len(accepted) + len(rejected))
         # all the times are default set to 0.0
     )
 
-    # perform the tests
-    for words, expected in [(accepted, True), (rejected, False)]:
-        while len(words) > 0:
-            w = words.pop()
-            position = logfile.tell()
-            output = f"{strftime('%H:%M:%S')}: '{w}'"
-            writelog(output, end="")
-
-            # words are popped, but list maintains capacity until we delete manually
-            if len(words) % 100 == 0:
-                del words[:len(words)]
-
-            for method in METHODS:
-                res, cpu_time = method(tree, w)
-                assert res is expected, f"{regexp} using {method.__name__} should{'' if expected else ' not'} "\
-                    f"have accepted {w}. Returned {res}"
-                entry.add_time(method, cpu_time)
-
-            logfile.seek(position)
-            writelog(" "*len(output), end="") # overwrite the word
-            logfile.seek(position)
-            writelog(".", end="") # mark it as finished
-
-    # write the results
+
+def time_word(regexp: str, tree: RegExp, w: str, expected: bool, entry: OutputFileEntry):
+    """Add the time each method takes to decide w to the entry"""
+    for method in METHODS:
+        res, cpu_time = method(tree, w)
+        assert res is expected, f"{regexp} using {method.__name__} should{'' if expected else ' not'} "\
+            f"have accepted {w}. Returned {res}"
+        entry.add_time(method, cpu_time)
+
+
+def write_results(entry: OutputFileEntry, datadir: str, seconds: float, predicted_cost: float|None):
+    """Output the entry, and the wall `seconds` its whole job took together with the
+    scheduler's prediction of them (None if the scheduler was not calibrated in seconds)
+    """
     output_file = os.path.join(datadir, config().files.data_output)
     with open(output_file, "a") as file:
         file.write(entry.to_json() + "\n")
+    ResultsStore(os.path.join(datadir, config().files.data_columns)).append(entry)
+
+    # calibrates the scheduler's cost model, and records how well it predicted this regexp
+    with open(os.path.join(datadir, config().files.schedule_log), "a") as file:
+        predicted = float("nan") if predicted_cost is None else predicted_cost
+        file.write(f"{structural_cost(entry.regexp)}\t{predicted}\t{seconds}\t{entry.regexp}\n")
+
+
+def benchmark_regexp(regexp: str, datadir: str, predicted_cost: float|None=None,
+                     queue: queues.Queue|None=None):
+    telemetry = Telemetry(queue, regexp)
+
+    # prepare the tests, resuming from the checkpoint if the regexp was interrupted before
+    checkpoint = prepare_words(regexp, datadir, telemetry)
+    tree, translate = compile_tree(regexp)
+    stats = automaton_stats(tree) # built once, before any word is timed
+    accepted = [translate(w) for w in checkpoint.accepted]
+    rejected = [translate(w) for w in checkpoint.rejected]
+    nwords = len(accepted) + len(rejected)
+    entry = new_entry(regexp, accepted, rejected)
+    checkpoint.restore_times(entry)
+
+    # perform the tests
+    telemetry.phase("timing", nwords, checkpoint.done)
+    for i in range(checkpoint.done, nwords):
+        if i < len(accepted):
+            time_word(regexp, tree, accepted[i], True, entry)
+        else:
+            time_word(regexp, tree, rejected[i - len(accepted)], False, entry)
+
+        checkpoint.done = i + 1
+        if checkpoint.due():
+            checkpoint.save(entry)
+        telemetry.tick(i + 1, entry)
+
+    for key, value in stats.items():
+        setattr(entry, key, value)
+    write_results(entry, datadir, checkpoint.seconds(), predicted_cost)
+    checkpoint.remove()
+    telemetry.phase("done")
+
 
-    # cleanup
-    logfile.close()
-    os.remove(logfilename)
-    if os.path.exists(f"tmp/pict_{os.getpid()}.txt"):
-        os.remove(f"tmp/pict_{os.getpid()}.txt")
+def benchmark_chunk(regexp: str, datadir: str, start: int, stop: int,
+                    queue: queues.Queue|None=None) -> tuple[dict[str, float], dict[str, int|float], float, float]:
+    """Time words [start, stop) (accepted, then rejected) of a regexp whose words have been
+    generated by `prepare_words`. Each chunk compiles its own tree and builds its own automata.
+    Returns the time of each method, the automaton stats, the CPU time taken to compile the
+    tree and build its automata, and the wall time of the whole chunk
+    """
+    started = monotonic()
+    telemetry = Telemetry(queue, regexp)
+    checkpoint = Checkpoint(datadir, regexp)
+    checkpoint.load()
+    entry = new_entry(regexp, checkpoint.accepted, checkpoint.rejected)
+
+    ti = process_time()
+    tree, translate = compile_tree(regexp)
+    stats = automaton_stats(tree)
+    compile_seconds = process_time() - ti
+
+    # progress is reported out of all the regexp's words, so the chunks add up in the ETA
+    telemetry.phase("timing", entry.nwords_acc + entry.nwords_rej)
+    for i in range(start, stop):
+        if i < entry.nwords_acc:
+            time_word(regexp, tree, translate(checkpoint.accepted[i]), True, entry)
+        else:
+            time_word(regexp, tree, translate(checkpoint.rejected[i - entry.nwords_acc]), False, entry)
+        telemetry.tick(i + 1 - start, entry)
+
+    telemetry.phase("done")
+    times = dict((entry.method_time_key(method), entry.get_time(method)) for method in METHODS)
+    return times, stats, compile_seconds, monotonic() - started
+
+
+class Shards:
+    """The chunks of one regexp's words, timed by different workers and merged back into one entry"""
+    def __init__(self, regexp: str, predicted_cost: float|None):
+        self.regexp = regexp
+        self.predicted_cost = predicted_cost
+        self.pending = 0
+        self.failed = False
+        self.lost = False # a chunk's worker died, so the regexp is left for the next run
+        self.times: dict[str, float] = dict() # OutputFileEntry.method_time_key(method) => time
+        self.stats: dict[str, int|float] = dict() # automaton_stats, taken from one chunk as a single worker would
+        self.compile_seconds: list[float] = list()
+        self.seconds = 0.0 # wall time of the chunks
+
+    def chunks(self, nwords: int) -> list[tuple[int, int]]:
+        """Split the words into chunks of `chunk_words`"""
+        chunks = [(start, min(start + config().chunk_words, nwords))
+                  for start in range(0, nwords, config().chunk_words)]
+        self.pending = len(chunks)
+        return chunks
+
+    def add(self, times: dict[str, float]|None, stats: dict[str, int|float], compile_seconds: float, seconds: float):
+        """A chunk has finished. `times` is None if it failed"""
+        self.pending -= 1
+        if times is None:
+            self.failed = True
+            return
+        for key, time in times.items():
+            self.times[key] = self.times.get(key, 0.0) + time
+        self.stats = stats
+        self.compile_seconds.append(compile_seconds)
+        self.seconds += seconds
+
+    def finish(self, datadir: str):
+        """Write the merged results of every chunk, as `benchmark_regexp` would have"""
+        checkpoint = Checkpoint(datadir, self.regexp)
+        checkpoint.load()
+        entry = new_entry(self.regexp, checkpoint.accepted, checkpoint.rejected)
+        for key, value in (self.times | self.stats).items():
+            setattr(entry, key, value)
+        # the job's cost is the generation of the words (saved in the checkpoint) and every chunk
+        write_results(entry, datadir, checkpoint.elapsed + self.seconds, self.predicted_cost)
+
+        # a single worker would have compiled the tree and built its automata once
+        with open(os.path.join(datadir, config().files.shard_log), "a") as file:
+            file.write(f"{len(self.compile_seconds)}\t{sum(self.compile_seconds)}\t"
+                       f"{sum(self.compile_seconds) - fmean(self.compile_seconds)}\t{self.regexp}\n")
+        checkpoint.remove()
+
+
+_queue: queues.Queue|None = None # the dashboard's queue, inherited by each worker
+_started: queues.Queue|None = None # (task id, pid) of each task a worker starts, for `lost_tasks`
+
+def init_worker(queue: queues.Queue, started: queues.Queue):
+    """Workers live for the whole run, so DERIVATIVE_CACHE persists across their regexps"""
+    global _queue, _started
+    _queue = queue
+    _started = started
+    DERIVATIVE_CACHE.max_entries = config().derivative_cache_size
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # the parent handles Ctrl+C by terminating the pool
+
+
+def run_worker(task_id: int, regexp: str, datadir: str, predicted_cost: float|None) -> int:
+    """Benchmark a regexp in a worker. Returns the worker's pid"""
+    _started.put((task_id, os.getpid()))
+    try:
+        benchmark_regexp(regexp, datadir, predicted_cost, _queue)
+    except Exception:
+        traceback.print_exc() # a failed regexp must not take down the worker (and its cache)
+    return os.getpid()
+
+
+def run_prepare(task_id: int, regexp: str, datadir: str) -> tuple[int, int|None]:
+    """Generate a regexp's words in a worker. Returns the worker's pid and the number of words
+    (None if it failed)
+    """
+    _started.put((task_id, os.getpid()))
+    try:
+        telemetry = Telemetry(_queue, regexp)
+        checkpoint = prepare_words(regexp, datadir, telemetry)
+        telemetry.phase("done")
+        return os.getpid(), len(checkpoint.accepted) + len(checkpoint.rejected)
+    except Exception:
+        traceback.print_exc()
+        return os.getpid(), None
+
+
+def run_chunk(task_id: int, regexp: str, datadir: str, start: int, stop: int) -> tuple[int, dict[str, float]|None, dict[str, int|float], float, float]:
+    """Time a chunk of a regexp's words in a worker. Returns the worker's pid, the time of
+    each method (None if it failed), the automaton stats, the compile time, and the chunk's wall time
+    """
+    _started.put((task_id, os.getpid()))
+    try:
+        return os.getpid(), *benchmark_chunk(regexp, datadir, start, stop, _queue)
+    except Exception:
+        traceback.print_exc()
+        return os.getpid(), None, dict(), 0.0, 0.0
+
+
+_task_ids = count() # the id of each task handed to the pool
+_task_pids: dict[int, int] = dict() # task id => pid of the worker running it
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def lost_tasks(workers: dict, started: queues.Queue) -> list[AsyncResult]:
+    """The tasks whose worker process died (e.g., killed by the OOM killer during a huge PICT
+    run). The pool replaces the worker, but the task's result never becomes ready
+    """
+    try:
+        while True:
+            task_id, pid = started.get_nowait()
+            _task_pids[task_id] = pid
+    except Empty:
+        pass
+    return [result for result, (*_, task_id) in workers.items()
+            if task_id in _task_pids and not result.ready() and not alive(_task_pids[task_id])]
+
+
+def reap(workers: dict, pool: Pool, dashboard: Dashboard, datadir: str, started: queues.Queue,
+         lost: list[tuple[int, str]]) -> bool:
+    """Collect the finished tasks. Once a sharded regexp's words are ready its chunks are handed
+    out, and once all of its chunks finish they are merged. The regexps of tasks whose worker
+    died are added to `lost`, to be un-marked in the todo file. Returns if any regexp finished
+    """
+    for result in lost_tasks(workers, started):
+        linestart, repl, regexp, task, shards, task_id = workers.pop(result)
+        pid = _task_pids.pop(task_id)
+        print(f"Worker {pid} died during the {task} task of {regexp}. It is left for the next run")
+        lost.append((linestart, repl))
+        if task == "chunk":
+            shards.add(None, dict(), 0.0, 0.0)
+            shards.lost = True
+            if shards.pending > 0: # the regexp's other chunks are still running
+                dashboard.idle(pid)
+                continue
+        dashboard.lost(pid, regexp)
+
+    finished = False
+    for result in [result for result in workers if result.ready()]:
+        linestart, repl, regexp, task, shards, task_id = workers.pop(result)
+        _task_pids.pop(task_id, None)
+        if task == "regexp":
+            dashboard.finished(result.get(), regexp)
+            finished = True
+        elif task == "words":
+            pid, nwords = result.get()
+            if not nwords: # failed, or there is nothing to time
+                dashboard.finished(pid, regexp)
+                finished = True
+                continue
+            dashboard.idle(pid)
+            for start, stop in shards.chunks(nwords):
+                task_id = next(_task_ids)
+                chunk = pool.apply_async(run_chunk, (task_id, regexp, datadir, start, stop))
+                workers[chunk] = (linestart, repl, regexp, "chunk", shards, task_id)
+        else:
+            pid, times, stats, compile_seconds, seconds = result.get()
+            shards.add(times, stats, compile_seconds, seconds)
+            if shards.pending > 0:
+                dashboard.idle(pid)
+                continue
+            if shards.lost:
+                dashboard.lost(pid, regexp)
+                continue
+            if not shards.failed:
+                shards.finish(datadir)
+            dashboard.finished(pid, regexp)
+            finished = True
+    return finished
+
+
+def spent_alpha(look: int) -> float:
+    """The error probability spent by the first `look` looks at a length, out of 1 - confidence
+    for all of them (Lan & DeMets' Pocock-type spending function, over `per_length` regexps)
+    """
+    cfg = config().adaptive_sampling
+    t = min(1.0, look * cfg.min_per_length / config().gen.per_length)
+    return (1 - cfg.confidence) * log(1 + (e - 1) * t)
+
+
+def converged_lengths(store: ResultsStore, ranks: dict[str, int]) -> dict[int, tuple[int, float]]:
+    """Regexp lengths which have been sampled enough: every method's confidence interval
+    half-width is within the configured fraction of its mean (sequential sampling).
+
+    A length is looked at once every `min_per_length` of its regexps, and each look only uses
+    the results of that many of its first regexps in the sampling order (see sampling_ranks),
+    once all of them have finished, so neither the regexps which happen to finish first nor
+    calling this after every regexp bias the looks.
+    Each look's confidence level is spent from the configured one (alpha spending), so the
+    intervals of all the looks together keep the configured coverage.
+    Returns length => (number of regexps at the look, largest relative half-width)
+    """
+    if not store.exists():
+        return dict()
+
+    cfg = config().adaptive_sampling
+    converged = dict()
+    look = 1
+    while spent_alpha(look) > spent_alpha(look - 1):
+        n = look * cfg.min_per_length
+        agg = store.aggregate_ranked(ranks, n)
+        if not any(agg.n >= n):
+            break
+        confidence = 1 - (spent_alpha(look) - spent_alpha(look - 1))
+        widths = np.array([agg.relative_half_width(column, confidence) for column in agg.columns])
+        worst = widths.max(axis=0, initial=0.0) # nan (too few samples or zero mean) propagates
+        # rows imported from before a method existed did not measure it, so do not count
+        measured = np.array([agg.count[column] for column in agg.columns]).min(axis=0, initial=n)
+        for length, count, w in zip(agg.lengths, measured, worst):
+            if count == n and w <= cfg.relative_half_width and int(length) not in converged:
+                converged[int(length)] = (int(count), float(w))
+        look += 1
+    return converged
+
+
+def sampling_ranks(regexps_file: str) -> dict[str, int]:
+    """regexp => its rank among the distinct regexps of its length in a seeded random order. The
+    order only depends on the regexps file, so it is the same in every run of a campaign"""
+    rnd = random.Random(1)
+    bylength = dict()
+    with open(regexps_file, "r") as file:
+        for line in file:
+            regexp = line.removesuffix(os.linesep)
+            bylength.setdefault(regexp_length(regexp), dict())[regexp] = None
+    ranks = dict()
+    for length in sorted(bylength):
+        crossection = list(bylength[length])
+        rnd.shuffle(crossection)
+        ranks |= dict((regexp, rank) for rank, regexp in enumerate(crossection))
+    return ranks
+
+
+def sampling_order(todo: list[tuple[int, str]], predictions: dict[int, float],
+                   ranks: dict[str, int]) -> list[tuple[int, str]]:
+    """Dispatch the regexps of each length in their sampling rank order, so the regexps benchmarked
+    before a length converges are a random sample of it (the predicted order would start with
+    its most expensive regexps). Lengths are still dispatched by their mean predicted cost
+    """
+    bylength = dict()
+    for linestart, line in todo:
+        bylength.setdefault(regexp_length(line.removesuffix(os.linesep)), list()).append((linestart, line))
+    for crossection in bylength.values():
+        crossection.sort(key=lambda item: ranks.get(item[1].removesuffix(os.linesep), len(ranks)))
+
+    cost = lambda length: fmean(predictions.get(linestart, 0.0) for linestart, _ in bylength[length])
+    lengths = sorted(bylength, key=cost, reverse=True) if len(predictions) > 0 else sorted(bylength)
+    return [item for length in lengths for item in bylength[length]]
 
 
 if __name__ == "__main__":
@@ -100,59 +436,120 @@ if __name__ == "__main__":
         os.mkdir("tmp")
 
     DONE_MARKER = "= " # any line starting with this prefix is considered complete
-    workers = dict()
+    SKIP_MARKER = "~ " # any line starting with this prefix was skipped since its length converged
+    workers = dict() # AsyncResult => (linestart, replaced line start, regexp, task, Shards|None, task id)
+    lost = list() # (linestart, replaced line start) of the regexps whose worker died
+    pool = None
+    store = ResultsStore(os.path.join(datadir, config().files.data_columns))
+    output_file = os.path.join(datadir, config().files.data_output)
+    if not store.compatible():
+        print(f"The columns of {store.directory} do not match the methods' (see methods.py::METHODS). "
+              "Please rename or delete it to start a new store, or use a new data directory.")
+        exit(1)
+    if not store.sync(output_file):
+        print(f"{store.directory} and {output_file} have a different number of results. "
+              f"Please delete {store.directory} so it is rebuilt from {output_file}")
+        exit(1)
+    skipped_file = os.path.join(datadir, config().files.skipped)
     try:
         if not os.path.exists("data"): os.mkdir("data")
         with open(regexps_todo_file, "r+") as file:
+            todo = list()
             while True:
                 linestart = file.tell()
                 line = file.readline()
 
-                # if reached the end of file, exit deligator
+                # if reached the end of file, all todo regexps are found
                 if len(line) == 0:
                     break
 
-                # if the line has been marked done, continue to next line
-                if line.startswith(DONE_MARKER):
+                # if the line has been marked done or skipped, continue to next line
+                if line.startswith(DONE_MARKER) or line.startswith(SKIP_MARKER):
                     continue
 
+                todo.append((linestart, line))
+
+            # dispatch the most expensive regexps first so they do not straggle at the end
+            predictions = dict()
+            calibrated = False # are the predictions in seconds?
+            if config().scheduling == "predicted":
+                model = CostModel(os.path.join(datadir, config().files.schedule_log))
+                for linestart, line in todo:
+                    predictions[linestart] = model.predict(line.removesuffix(os.linesep))
+                todo.sort(key=lambda item: predictions[item[0]], reverse=True)
+                calibrated = model.calibrated
+            elif config().scheduling != "file":
+                raise ValueError(f"Unknown scheduling '{config().scheduling}'")
+            ranks = dict()
+            if config().adaptive_sampling.enabled:
+                ranks = sampling_ranks(regexps_file)
+                todo = sampling_order(todo, predictions, ranks)
+
+            dashboard = Dashboard(os.path.join(datadir, config().files.metrics),
+                                  [(line.removesuffix(os.linesep), predictions.get(linestart, 1.0))
+                                   for linestart, line in todo])
+            converged = converged_lengths(store, ranks) if config().adaptive_sampling.enabled else dict()
+            started = Queue()
+            pool = Pool(config().multiprocessing, initializer=init_worker, initargs=(dashboard.queue, started))
+            for linestart, line in todo:
                 # do not exceed multiprocessing amount
                 while len(workers) >= config().multiprocessing:
-                    for proc in workers.copy():
-                        if not proc.is_alive():
-                            workers.pop(proc)
+                    if reap(workers, pool, dashboard, datadir, started, lost) and config().adaptive_sampling.enabled:
+                        converged = converged_lengths(store, ranks)
+                    dashboard.update()
                     sleep(0.2)
 
+                # skip regexps of a length which already has tight enough confidence intervals
+                regexp = line.removesuffix(os.linesep)
+                if regexp_length(regexp) in converged:
+                    file.seek(linestart)
+                    file.write(SKIP_MARKER)
+                    file.flush()
+                    n, worst = converged[regexp_length(regexp)]
+                    with open(skipped_file, "a") as skipped:
+                        skipped.write(f"{regexp_length(regexp)}\t{n}\t{worst}\t{regexp}\n")
+                    dashboard.skipped(regexp)
+                    continue
+
                 # mark the line as done by overwriting the beginning of the line with DONE_MARKER
                 file.seek(linestart)
                 file.write(DONE_MARKER)
                 file.flush()
-                file.readline() # go to the end of the line again
 
-                # call the process
-                regexp = line.removesuffix(os.linesep)
-                proc = Process(target=benchmark_regexp, args=(regexp, datadir), name=f"Python-{regexp[:16]}")
-                proc.start()
-                workers[proc] = (linestart, line[:len(DONE_MARKER)])
+                # hand the regexp to an idle worker, or its words to be generated and then split
+                # into chunks for many workers (see `reap`)
+                task_id = next(_task_ids)
+                if config().chunk_words > 0:
+                    result = pool.apply_async(run_prepare, (task_id, regexp, datadir))
+                    workers[result] = (linestart, line[:len(DONE_MARKER)], regexp, "words",
+                                       Shards(regexp, predictions.get(linestart) if calibrated else None), task_id)
+                else:
+                    result = pool.apply_async(run_worker, (task_id, regexp, datadir,
+                                                           predictions.get(linestart) if calibrated else None))
+                    workers[result] = (linestart, line[:len(DONE_MARKER)], regexp, "regexp", None, task_id)
 
-        # keep the main thread alive until all workers exit
+        # keep the main thread alive until all workers finish
         while len(workers) > 0:
-            for proc in workers.copy():
-                if not proc.is_alive():
-                    workers.pop(proc)
+            reap(workers, pool, dashboard, datadir, started, lost)
+            dashboard.update()
             sleep(0.2)
 
+        # the pool would wait forever for the results of lost tasks, so it is terminated instead
+        if len(lost) == 0:
+            pool.close()
+            pool.join()
+        dashboard.update(force=True)
+
         print("\n\nDone!")
 
     except KeyboardInterrupt:
         pass
     finally:
         with open(regexps_todo_file, "r+") as file:
-            for proc in workers:
-                linestart, repl = workers[proc]
+            for linestart, repl, *_ in list(workers.values()) + lost:
                 file.seek(linestart)
                 file.write(repl)
-                if proc.is_alive():
-                    proc.kill()
+        if pool is not None:
+            pool.terminate()
 
     shutil.rmtree("tmp")
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""Predict how expensive a regular expression is to benchmark, so that the most
+expensive regexps can be dispatched first (longest-predicted-job-first). The regexps
+file is sorted by ascending length, so file order leaves the slowest regexps for
+the very end of a campaign where they run on only a few cores.
+
+The cost of a regexp is the wall time of its whole job: generating its words (PICT and
+the rejection search, which dominate the slowest regexps) and timing every method.
+"""
+
+import os
+from statistics import fmean
+from utils import *
+from converters import RegExpConverter
+
+
+def structural_cost(regexp: str) -> float:
+    """An uncalibrated estimate of the cost of benchmarking a regexp.
+    Longer regexps have longer words and larger derivatives/automata, and each level
+    of star height multiplies the generated language (stars are taken 0, 1, and 3 times)
+    """
+    height = RegExpConverter.str_to_regexp(regexp).starHeight()
+    return max(1, regexp_length(regexp)) ** 2 * 3 ** height
+
+
+def read_schedule_log(schedule_file: str) -> list[tuple[float, float, float, str]]:
+    """The (structural cost, predicted seconds or NaN, actual seconds, regexp) of every benchmarked
+    regexp. Lines of older logs, whose actual cost was only the methods' CPU time, are left out
+    """
+    rows = list()
+    with open(schedule_file, "r") as handle:
+        for line in handle:
+            fields = line.removesuffix("\n").split("\t")
+            if len(fields) == 4:
+                rows.append((float(fields[0]), float(fields[1]), float(fields[2]), fields[3]))
+    return rows
+
+
+class CostModel:
+    """Calibrates `structural_cost` into seconds using the regexps already benchmarked (the
+    schedule log). The scale factor (actual / structural) is averaged per regexp length, and
+    the overall average is used for lengths which have not been benchmarked yet. Until then
+    the model is not `calibrated` and its predictions are only structural costs, which rank
+    the regexps but are not seconds.
+    """
+    def __init__(self, schedule_file: str):
+        self.ratios: dict[int, float] = dict()
+        self.default_ratio = 1.0
+        self.calibrated = False
+
+        if not os.path.exists(schedule_file):
+            return
+
+        ratios: dict[int, list[float]] = dict()
+        for structural, _, seconds, regexp in read_schedule_log(schedule_file):
+            crossection = ratios.get(regexp_length(regexp), list())
+            crossection.append(seconds / structural)
+            ratios[regexp_length(regexp)] = crossection
+
+        if len(ratios) > 0:
+            self.ratios = dict((length, fmean(r)) for length, r in ratios.items())
+            self.default_ratio = fmean(r for crossection in ratios.values() for r in crossection)
+            self.calibrated = True
+
+    def predict(self, regexp: str) -> float:
+        """Predict the wall time (in seconds, once calibrated) of benchmarking the regexp"""
+        ratio = self.ratios.get(regexp_length(regexp), self.default_ratio)
+        return ratio * structural_cost(regexp)
@@ -0,0 +1,179 @@
+"""Decide membership of a word which is fed in chunks, so words larger than memory (e.g., a
+memory-mapped file of symbols) can be decided in constant memory:
+
+    compiled = FollowStream.compile(tree)
+    state = FollowStream.start(compiled)
+    for chunk in chunks:
+        if not FollowStream.feed(state, chunk):
+            break # the state is dead: no continuation of the word can be accepted
+    FollowStream.result(state)
+
+Chunks are `str` or bytes-like; bytes are decoded as one symbol per byte (latin-1).
+
+FollowStream simulates the follow NFA, trimmed to the states which can still reach a final
+state, determinizing it lazily: each (state set, symbol) transition is computed once and then
+looked up. PDStream keeps the set of partial derivatives, as `methods.pdfast` does, leaving
+out those which denote the empty language. So both are dead as soon as no continuation of
+the word can be accepted.
+
+$ python streaming.py "(a+b)*c" words.txt    # one symbol per byte; a trailing newline is ignored
+"""
+
+import os
+import sys
+import mmap
+from copy import deepcopy
+from FAdo.reex import RegExp, CEmptySet, CDisj, CConcat
+from methods import KeyedSet
+from nfa_words import epsilon_free
+from bisimulation import _trim
+
+
+def _symbols(chunk: str|bytes|bytearray|memoryview) -> str:
+    return chunk if isinstance(chunk, str) else bytes(chunk).decode("latin-1")
+
+
+class _FollowCompiled:
+    def __init__(self, tree: RegExp, max_cached_sets: int):
+        nfa = tree.nfaFollow()
+        delta, final = epsilon_free(nfa)
+        self.delta, self.initial, self.final = _trim(delta, frozenset(nfa.Initial), final)
+        self.dfa: dict[frozenset[int], dict[str, frozenset[int]]] = dict() # lazily determinized
+        self.max_cached_sets = max_cached_sets
+
+class _FollowState:
+    def __init__(self, compiled: _FollowCompiled):
+        self.compiled = compiled
+        self.current = compiled.initial
+        self.consumed = 0 # number of symbols fed
+
+class FollowStream:
+    """Streaming membership on the follow automaton"""
+    @classmethod
+    def compile(cls, tree: RegExp, max_cached_sets: int=10_000) -> _FollowCompiled:
+        """At most `max_cached_sets` state sets of the lazy DFA are kept (the cache is then reset)"""
+        return _FollowCompiled(tree, max_cached_sets)
+
+    @classmethod
+    def start(cls, compiled: _FollowCompiled) -> _FollowState:
+        return _FollowState(compiled)
+
+    @classmethod
+    def feed(cls, state: _FollowState, chunk: str|bytes|bytearray|memoryview) -> bool:
+        """Consume a chunk of symbols. Returns False once the state is dead"""
+        compiled = state.compiled
+        dfa = compiled.dfa
+        delta = compiled.delta
+        current = state.current
+        if len(current) == 0:
+            return False
+
+        for symbol in _symbols(chunk):
+            row = dfa.get(current)
+            if row is None:
+                if len(dfa) >= compiled.max_cached_sets:
+                    dfa.clear()
+                row = dfa[current] = dict()
+            following = row.get(symbol)
+            if following is None:
+                following = row[symbol] = frozenset(t for s in current for t in delta[s].get(symbol, ()))
+
+            current = following
+            state.consumed += 1
+            if len(current) == 0:
+                break
+
+        state.current = current
+        return len(current) > 0
+
+    @classmethod
+    def result(cls, state: _FollowState) -> bool:
+        return not state.current.isdisjoint(state.compiled.final)
+
+
+def _empty_language(re: RegExp) -> bool:
+    """Does the regexp denote the empty language? E.g., a partial derivative of `r@empty_set`"""
+    if isinstance(re, CEmptySet):
+        return True
+    if isinstance(re, CDisj):
+        return _empty_language(re.arg1) and _empty_language(re.arg2)
+    if isinstance(re, CConcat):
+        return _empty_language(re.arg1) or _empty_language(re.arg2)
+    return False # atoms, epsilon, and stars accept some word
+
+class _PDState:
+    def __init__(self, compiled: RegExp):
+        self.empty: dict[str, bool] = dict() # pdkey => _empty_language, as the same derivatives recur
+        self.current = KeyedSet("pdkey", [pd for pd in [compiled] if not self.is_empty(pd)])
+        self.consumed = 0 # number of symbols fed
+
+    def is_empty(self, pd: RegExp) -> bool:
+        if pd.pdkey not in self.empty:
+            self.empty[pd.pdkey] = _empty_language(pd)
+        return self.empty[pd.pdkey]
+
+class PDStream:
+    """Streaming membership using partial derivatives"""
+    @classmethod
+    def compile(cls, tree: RegExp) -> RegExp:
+        tree = deepcopy(tree) # deepcopied so attribute `pdkey` is not created on the passed regexp
+        tree.save_pdkey()
+        return tree
+
+    @classmethod
+    def start(cls, compiled: RegExp) -> _PDState:
+        return _PDState(compiled)
+
+    @classmethod
+    def feed(cls, state: _PDState, chunk: str|bytes|bytearray|memoryview) -> bool:
+        """Consume a chunk of symbols. Returns False once the state is dead"""
+        current = state.current
+        if len(current) == 0:
+            return False
+
+        for symbol in _symbols(chunk):
+            next = KeyedSet("pdkey")
+            for re in current:
+                for pd in re.keyed_pds(symbol):
+                    if not state.is_empty(pd):
+                        next.add(pd)
+            current = next
+            state.consumed += 1
+            if len(current) == 0:
+                break
+
+        state.current = current
+        return len(current) > 0
+
+    @classmethod
+    def result(cls, state: _PDState) -> bool:
+        return any(map(lambda pd: pd.ewp(), state.current))
+
+
+def decide_file(engine: type, tree: RegExp, fname: str, chunk_size: int=1 << 20) -> bool:
+    """Decide membership of the symbols in a file (one per byte), memory-mapped and fed
+    `chunk_size` bytes at a time. A trailing newline ends the line of a text file rather than
+    being a symbol, so it is not fed. Stops reading as soon as the state is dead
+    """
+    state = engine.start(engine.compile(tree))
+    with open(fname, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size > 0: # an empty file cannot be memory-mapped
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = len(mapped) - 1 if mapped[-1:] == b"\n" else len(mapped)
+                for i in range(0, end, chunk_size):
+                    if not engine.feed(state, mapped[i:min(i + chunk_size, end)]):
+                        break
+    return engine.result(state)
+
+
+if __name__ == "__main__":
+    from converters import RegExpConverter
+
+    if len(sys.argv) <= 2:
+        print("Please provide a regular expression and a file of symbols as command-line arguments")
+        print(f"E.g., $ python {sys.argv[0]} \"(a+b)*c\" words.txt")
+        exit(1)
+
+    tree = RegExpConverter.str_to_regexp(sys.argv[1])
+    for engine in [FollowStream, PDStream]:
+        print(engine.__name__, decide_file(engine, tree, sys.argv[2]))
@@ -0,0 +1,195 @@
+"""Progress and throughput telemetry from the benchmarking workers.
+
+Workers push a snapshot of their progress (phase, words tested, words/s, each
+method's cumulative time, and the hit rate of the worker's derivative cache) over a multiprocessing queue, at most once every
+`telemetry_seconds`. Inside the timed loop this costs a clock read per word; nothing
+is written until the interval has elapsed.
+
+The parent process collects the snapshots into a live dashboard with an ETA for the
+whole todo set, and writes the same information to the metrics file.
+"""
+
+import os
+import sys
+import json
+from time import monotonic, strftime
+from multiprocessing import Queue, queues
+from queue import Empty
+from utils import *
+from methods import DERIVATIVE_CACHE
+
+
+class Telemetry:
+    """The worker side: reports the progress of benchmarking one regexp"""
+    def __init__(self, queue: queues.Queue|None, regexp: str):
+        self.queue = queue
+        self.regexp = regexp
+        self.current = "starting"
+        self.nwords = 0
+        self.done = 0
+        self.words_per_sec = 0.0
+        self.times: dict[str, float] = dict()
+        self.last_push = monotonic()
+        self.last_done = 0
+
+    def phase(self, name: str, nwords: int=0, done: int=0):
+        """Start a new phase: pict, rejection, timing, or done. Always pushed immediately"""
+        self.current = name
+        self.nwords = nwords
+        self.done = done
+        self.last_done = done
+        self.push()
+
+    def tick(self, done: int, entry: OutputFileEntry):
+        """Another word has been tested. Pushes a snapshot if the interval has elapsed"""
+        if monotonic() - self.last_push >= config().telemetry_seconds:
+            self.done = done
+            self.times = dict((method.__name__, entry.get_time(method)) for method in METHODS)
+            self.push()
+
+    def push(self):
+        now = monotonic()
+        self.words_per_sec = (self.done - self.last_done) / max(now - self.last_push, 1e-9)
+        self.last_push = now
+        self.last_done = self.done
+        if self.queue is not None:
+            self.queue.put({
+                "pid": os.getpid(),
+                "regexp": self.regexp,
+                "phase": self.current,
+                "done": self.done,
+                "nwords": self.nwords,
+                "words_per_sec": self.words_per_sec,
+                "times": self.times,
+                "derivative_cache": DERIVATIVE_CACHE.stats()
+            })
+
+
+def _hms(seconds: float) -> str:
+    days, seconds = divmod(int(seconds), 86_400)
+    hours, seconds = divmod(seconds, 3_600)
+    minutes, seconds = divmod(seconds, 60)
+    return (f"{days}d " if days > 0 else "") + f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+class Dashboard:
+    """The parent side: collects worker snapshots, estimates the time remaining, and
+    periodically redraws the terminal and rewrites the metrics file.
+
+    Progress is weighted by each regexp's predicted cost (see scheduling.py) when
+    available, otherwise every regexp counts equally. A regexp being timed counts for
+    the fraction of its words which have been tested.
+    """
+    def __init__(self, metrics_file: str, todo: list[tuple[str, float]]):
+        self.queue = Queue()
+        self.metrics_file = metrics_file
+        self.weights = dict(todo) # regexp => predicted cost
+        self.ntodo = len(todo)
+        self.total = sum(weight for _, weight in todo)
+        self.completed = 0.0
+        self.ncompleted = 0
+        self.nskipped = 0
+        self.nlost = 0
+        self.workers: dict[int, dict] = dict() # pid => latest snapshot
+        self.caches: dict[int, dict] = dict() # pid => latest derivative cache stats, kept after finishing
+        self.start = monotonic()
+        self.last_render = 0.0
+
+    def idle(self, pid: int):
+        """A worker process has finished a task which does not complete a regexp (e.g., a chunk)"""
+        self.drain()
+        self.workers.pop(pid, None)
+
+    def finished(self, pid: int, regexp: str):
+        """A worker process has finished a regexp"""
+        self.idle(pid)
+        self.completed += self.weights.get(regexp, 0.0)
+        self.ncompleted += 1
+
+    def lost(self, pid: int, regexp: str):
+        """A worker process died while benchmarking a regexp, which is left for the next run"""
+        self.idle(pid)
+        self.total -= self.weights.get(regexp, 0.0)
+        self.nlost += 1
+
+    def skipped(self, regexp: str):
+        """A regexp will not be benchmarked (see adaptive sampling in run_benchmarks.py)"""
+        self.total -= self.weights.get(regexp, 0.0)
+        self.nskipped += 1
+
+    def drain(self):
+        try:
+            while True:
+                snapshot = self.queue.get_nowait()
+                self.caches[snapshot["pid"]] = snapshot["derivative_cache"]
+                if snapshot["phase"] != "done":
+                    self.workers[snapshot["pid"]] = snapshot
+        except Empty:
+            pass
+
+    def eta(self) -> float|None:
+        """Estimated seconds until the todo set is finished"""
+        progress = self.completed
+        for snapshot in self.workers.values():
+            if snapshot["phase"] == "timing" and snapshot["nwords"] > 0:
+                progress += self.weights.get(snapshot["regexp"], 0.0) * snapshot["done"] / snapshot["nwords"]
+
+        elapsed = monotonic() - self.start
+        if progress <= 0 or elapsed <= 0:
+            return None
+        return (self.total - progress) / (progress / elapsed)
+
+    def cache_hit_rate(self) -> dict:
+        """The derivative cache stats summed over all workers"""
+        hits = sum(stats["hits"] for stats in self.caches.values())
+        misses = sum(stats["misses"] for stats in self.caches.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses > 0 else None
+        }
+
+    def update(self, force: bool=False):
+        """Drain the queue and, once per interval, redraw and write the metrics file"""
+        self.drain()
+        if not force and monotonic() - self.last_render < config().telemetry_seconds:
+            return
+        self.last_render = monotonic()
+
+        eta = self.eta()
+        metrics = {
+            "time": strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed_seconds": monotonic() - self.start,
+            "regexps_done": self.ncompleted,
+            "regexps_skipped": self.nskipped,
+            "regexps_lost": self.nlost,
+            "regexps_todo": self.ntodo,
+            "eta_seconds": eta,
+            "derivative_cache": self.cache_hit_rate(),
+            "workers": list(self.workers.values())
+        }
+        tmpname = self.metrics_file + ".tmp"
+        with open(tmpname, "w") as handle:
+            json.dump(metrics, handle, indent=2)
+        os.replace(tmpname, self.metrics_file)
+
+        lines = [f"{metrics['time']}  regexps {self.ncompleted}/{self.ntodo} done, "
+                 f"{self.nskipped} skipped, "
+                 f"{len(self.workers)} running, ETA {'?' if eta is None else _hms(eta)}"]
+        if self.nlost > 0:
+            lines[0] += f", {self.nlost} lost to dead workers"
+        hit_rate = metrics["derivative_cache"]["hit_rate"]
+        if hit_rate is not None:
+            lines[0] += f", derivative cache hit rate {hit_rate:.1%}"
+        for snapshot in sorted(self.workers.values(), key=lambda s: s["pid"]):
+            lines.append(f"  {str(snapshot['pid']).ljust(7)} {snapshot['phase'].ljust(9)} "
+                         f"{snapshot['done']:>5}/{snapshot['nwords']:<5} words "
+                         f"{snapshot['words_per_sec']:8.2f} words/s  {snapshot['regexp'][:48]}")
+            if len(snapshot["times"]) > 0:
+                lines.append("          " + "  ".join(f"{name} {time:.2f}s"
+                                                      for name, time in snapshot["times"].items()))
+
+        if sys.stdout.isatty():
+            print("\x1b[2J\x1b[H", end="") # clear the terminal and redraw in place
+        print("\n".join(lines))
+        sys.stdout.flush()
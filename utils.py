@@ -1,17 +1,21 @@
 from functools import cache
 from dataclasses import dataclass
-from typing import Callable, TypeVar, Type, List
+from typing import Callable, TypeVar, Type, List, Iterable, Iterator
+from itertools import chain
+from heapq import heappush, heapreplace
+from hashlib import blake2b
+from time import monotonic
 import sys
 import os
 import subprocess
+import threading
 import random
 import yaml
 import json
 from FAdo.reex import *
-from FAdo.cfg import smallAlphabet
-from FAdo.fa import EnumNFA
 from converters import RegExpConverter
-from methods import METHODS
+from nfa_words import BoundedWordEnumerator
+from methods import METHODS, AUTOMATON_SIZES, AUTOMATON_TIMES
 
 
 @dataclass
@@ -23,20 +27,63 @@ class _GenConfig:
     lengths: list[int]
     per_length: int
 
+@dataclass
+class _AdaptiveSamplingConfig:
+    enabled: bool
+    confidence: float
+    relative_half_width: float
+    min_per_length: int
+
+@dataclass
+class _WordLengthsConfig:
+    regexps_per_length: int
+    lengths: list[int]
+    words_per_length: int
+    max_method_seconds: float
+
 @dataclass
 class _FileConfig:
     regexps: str
     regexps_todo: str
     data_output: str
+    data_columns: str
+    schedule_log: str
+    checkpoints: str
+    metrics: str
+    skipped: str
+    shard_log: str
+    word_length_output: str
 
 @dataclass
 class Config:
     gen: _GenConfig
     multiprocessing: int
+    scheduling: str
     max_pict_seconds: float
+    checkpoint_seconds: float
+    telemetry_seconds: float
+    derivative_cache_size: int
+    alphabet_compression: bool
+    chunk_words: int
+    adaptive_sampling: _AdaptiveSamplingConfig
+    word_lengths: _WordLengthsConfig
     files: _FileConfig
 
 
+def alphabet(size: int) -> list[str]:
+    """`size` single-character symbols: a-z and A-Z (as FAdo's smallAlphabet, which stops
+    there), then 0-9, then the Unicode letters from U+00C0 on
+    """
+    symbols = [chr(c) for c in range(ord("a"), ord("z") + 1)] + [chr(c) for c in range(ord("A"), ord("Z") + 1)] \
+        + [chr(c) for c in range(ord("0"), ord("9") + 1)]
+    code = 0xC0
+    while len(symbols) < size:
+        if chr(code).isalpha():
+            symbols.append(chr(code))
+        code += 1
+    return symbols[:size]
+
+
 @cache
 def config() -> Config:
     """Gets the configuration options"""
@@ -47,14 +94,22 @@ def config() -> Config:
     return Config(
         gen=_GenConfig(
             alphabet_size=cfg["gen"]["alphabet_size"],
-            alphabet=set(smallAlphabet(cfg["gen"]["alphabet_size"])),
+            alphabet=set(alphabet(cfg["gen"]["alphabet_size"])),
             epsilon=None if cfg["gen"]["epsilon"] is False else True,
             empty=None if cfg["gen"]["empty"] is False else True,
             lengths=cfg["gen"]["lengths"],
             per_length=cfg["gen"]["per_length"]
         ),
         multiprocessing=cfg["multiprocessing"],
+        scheduling=cfg["scheduling"],
         max_pict_seconds=cfg["max_pict_seconds"],
+        checkpoint_seconds=cfg["checkpoint_seconds"],
+        telemetry_seconds=cfg["telemetry_seconds"],
+        derivative_cache_size=cfg["derivative_cache_size"],
+        alphabet_compression=cfg["alphabet_compression"],
+        chunk_words=cfg["chunk_words"],
+        adaptive_sampling=_AdaptiveSamplingConfig(**cfg["adaptive_sampling"]),
+        word_lengths=_WordLengthsConfig(**cfg["word_lengths"]),
         files=_FileConfig(**cfg["files"])
     )
 
@@ -71,6 +126,11 @@ def get_output_dir():
     return sys.argv[1]
 
 
+def regexp_length(regexp: str) -> int:
+    """The length of a regexp string, counting the multi-character special symbols as one"""
+    return len(regexp.replace(Epsilon, "@").replace(EmptySet, "@"))
+
+
 _T = TypeVar("_T")
 class OutputFileEntry:
     """A class to simplify io to the output file"""
@@ -83,6 +143,10 @@ class OutputFileEntry:
     def __init__(self, **kwargs):
         for method in METHODS:
             setattr(self, self.method_time_key(method), 0.0)
+        for key in AUTOMATON_SIZES:
+            setattr(self, key, 0)
+        for key in AUTOMATON_TIMES:
+            setattr(self, key, 0.0)
 
         for attr, cls in self.__annotations__.items():
             if attr in kwargs:
@@ -145,6 +209,10 @@ class OutputFileEntry:
 # Dynamically inject additional annotations based on METHODS used
 for method in METHODS:
     OutputFileEntry.__annotations__[OutputFileEntry.method_time_key(method)] = float
+for key in AUTOMATON_SIZES:
+    OutputFileEntry.__annotations__[key] = int
+for key in AUTOMATON_TIMES:
+    OutputFileEntry.__annotations__[key] = float
 
 
 def radix_sort(language):
@@ -162,48 +230,69 @@ def radix_sort(language):
     return lang
 
 
-def _concat_pict(*arr: List[set[str]], max_timeout: int=300) -> set[str]:
+def _concat_pict(*arr: List[str], max_timeout: int=300) -> Iterator[str]:
     """Uses Microsoft's PICT command-line tool to find pairwise coverage
-    for a given list of languages `arr`
+    for a given list of languages `arr`. The words are yielded as PICT outputs them.
+    Raises subprocess.TimeoutExpired if PICT takes longer than `max_timeout` seconds
     """
     fname = f"tmp/pict_{os.getpid()}.txt"
-    output = ""
-    for num, words in enumerate(arr):
-        output += f"{num}: {', '.join(w if len(w)>0 else '_' for w in words)}\n"
 
-    # prepare the file
+    # prepare the file. PICT is given the index of each word rather than the word itself,
+    # since it cannot read symbols outside of ASCII (large alphabets) nor the empty word
+    os.makedirs("tmp", exist_ok=True)
+    with open(fname, "w") as handle:
+        for num, words in enumerate(arr):
+            handle.write(f"{num}: {', '.join(f'w{i}' for i in range(len(words)))}\n")
+
+    # call pict, and kill it if it takes too long
+    deadline = monotonic() + max_timeout
+    proc = subprocess.Popen(["pict", fname], stdout=subprocess.PIPE, encoding="utf-8")
+    timer = threading.Timer(max_timeout, proc.kill)
+    timer.start()
     try:
-        with open(fname, "w") as handle:
-            handle.write(output)
-    except FileNotFoundError:
-        os.mkdir("tmp")
-        with open(fname, "w") as handle:
-            handle.write(output)
-
-    # call pict
-    results = subprocess.check_output(["pict", fname], encoding="utf-8", timeout=max_timeout)
-    return set(word.replace("\t", "").replace("_", "") for word in results.splitlines()[1:])
-
-
-def get_random_sample(population, n: int):
-    """Retrieve up to n items from population selected without replacement.
-    Throw away and clear all non-selected items.
+        columns = [int(num) for num in proc.stdout.readline().split()] # the header of parameter names
+        for line in proc.stdout:
+            yield "".join(arr[num][int(token[1:])] for num, token in zip(columns, line.split()))
+    finally:
+        timer.cancel()
+        proc.kill() # no-op unless the consumer stopped early
+        proc.stdout.close()
+        proc.wait()
+        os.remove(fname)
+
+    if proc.returncode != 0:
+        if monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(proc.args, max_timeout)
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+
+def reservoir_sample(stream: Iterable[str], n: int, rnd: random.Random) -> list[str]:
+    """Select up to n distinct items uniformly at random from a stream in one pass, so at most
+    n items are ever held in memory. Every item is given a pseudorandom priority by hashing it
+    with a key drawn from `rnd`, and the n distinct items of smallest priority are kept
+    (bottom-k sampling). Repeats of an item have the same priority, so the items the stream
+    repeats often (e.g., short words) are not any more likely to be selected.
     """
-    t = type(population)
-    if t is not list:
-        population = list(population)
-
-    rnd = random.Random(1)
-    indices = list(range(0, len(population)))
-    rnd.shuffle(indices)
-
-    sample = [population[i] for i in indices[:n]]
-    population.clear()
-    return t(sample)
-
-
-def pairwise_language_generation(sre, maxsize: int=2_048, max_timeout: int=300) -> set[str]:
-    """Finds a set of accepted words for the regular expression.
+    key = rnd.getrandbits(64).to_bytes(8, "little")
+    heap = list() # (-priority, item), so the largest priority kept is on top
+    members = set()
+    for item in stream:
+        if item in members:
+            continue
+        priority = int.from_bytes(blake2b(item.encode("utf-8"), key=key, digest_size=8).digest(), "little")
+        if len(heap) < n:
+            heappush(heap, (-priority, item))
+            members.add(item)
+        elif priority < -heap[0][0]:
+            _, evicted = heapreplace(heap, (-priority, item))
+            members.discard(evicted)
+            members.add(item)
+    return [item for _, item in sorted(heap, reverse=True)] # by priority: a random order
+
+
+def pairwise_language_generation(sre, maxsize: int=2_048, max_timeout: int=300,
+                                 rnd: random.Random|None=None) -> list[str]:
+    """Finds a list of distinct accepted words for the regular expression.
     Note this expects a SRE tree to take full advantage of pairwise features.
 
     Lixiao Zheng, Shuai Ma, Yuanyang Wang, and Gang Lin.
@@ -213,66 +302,51 @@ def pairwise_language_generation(sre, maxsize: int=2_048, max_timeout: int=300)
     Inspired from that paper. Note star repetitions are taken 0, 1, and 3 times.
 
     Example:
-        >>> pairwise_language_generation(RegExpConverter.str_to_sre("(a+b+c)(d+e)(f+g+h)"))
-        {'aeg', 'beg', 'cdg', 'adh', 'ceh', 'bef', 'adf', 'bdh', 'cdf'}
+        >>> sorted(pairwise_language_generation(RegExpConverter.str_to_sre("(a+b+c)(d+e)(f+g+h)")))
+        ['adf', 'aeg', 'aeh', 'bdg', 'bdh', 'bef', 'cdf', 'cdg', 'ceh']
+
+    The languages of the subexpressions are streamed (PICT output is read line by line)
+    into a seeded uniform sample of `maxsize` distinct words, so no more than `maxsize` words
+    are held per level of the tree regardless of how large the languages are.
 
     Note: if the call to pict takes longer than the configured maximum, we fall
     back on NFA enumeration
     """
+    if rnd is None:
+        rnd = random.Random(1)
+    generate = lambda child: pairwise_language_generation(child, maxsize, max_timeout, rnd)
+
     try:
         t = type(sre)
         if t is CAtom:
-            return set([sre.val])
+            return [sre.val]
         elif t is CEpsilon:
-            return set([""])
+            return [""]
         elif t is CEmptySet:
-            return set()
+            return []
         elif t is SDisj:
-            lang = set()
-            for child in sre.arg:
-                lang.update(pairwise_language_generation(child))
-            if len(lang) > maxsize:
-                lang = get_random_sample(lang, maxsize)
-            return lang
+            # the children are a set: sorted, since its order changes with each process' hash seed
+            return reservoir_sample(chain.from_iterable(generate(child) for child in sorted(sre.arg, key=str)),
+                                    maxsize, rnd)
         elif t is SStar:
-            lang = pairwise_language_generation(sre.arg)
-            lang.add("")
-            lang.update(_concat_pict(lang, lang, lang, max_timeout=max_timeout))
-            if len(lang) > maxsize:
-                lang = get_random_sample(lang, maxsize)
-            return lang
+            lang = generate(sre.arg)
+            if "" not in lang:
+                lang.append("")
+            return reservoir_sample(chain(lang, _concat_pict(lang, lang, lang, max_timeout=max_timeout)),
+                                    maxsize, rnd)
         elif t is SConcat:
-            lang = _concat_pict(*[ pairwise_language_generation(child) for child in sre.arg ],
-                                max_timeout=max_timeout)
-            if len(lang) > maxsize:
-                lang = get_random_sample(lang, maxsize)
-            return lang
+            return reservoir_sample(_concat_pict(*[ generate(child) for child in sre.arg ],
+                                                 max_timeout=max_timeout), maxsize, rnd)
         else:
             raise NotImplementedError()
     except subprocess.TimeoutExpired:
-        nfa: EnumNFA = EnumNFA(RegExpConverter.sre_to_regexp(sre).nfaFollow())
-        lang = set()
-
         # if pict is taking too long, enumerate only a "small" part of the language
-        length = min_word_length(sre)
-        nfa.initStack()
-        nfa.tmin = {}
-        word = nfa.minWord(length)
-        while len(lang) < 100 and length <= min(max_word_length(sre), 500):
-            if word is None:
-                length += 1
-                nfa.tmin = {}
-                nfa.initStack()
-                word = nfa.minWord(length)
-            else:
-                lang.add(word)
-                nfa.fillStack(word)
-                word = nfa.nextWord(word)
-
-        return lang
-
-
-def find_rejected_words(evalWordP: Callable[[str], bool], accepted: set[str]) -> set[str]:
+        enumerator = BoundedWordEnumerator(RegExpConverter.sre_to_regexp(sre).nfaFollow(),
+                                           int(min(max_word_length(sre), 500)))
+        return list(enumerator.sample(100, per_length=10, rnd=rnd))
+
+
+def find_rejected_words(evalWordP: Callable[[str], bool], accepted: list[str]) -> set[str]:
     """Delete characters from accepting words to create potentially rejecting words.
     The returned set of rejecting words have been tested for membership, and are edit distance
     one away from an accepting word (aka the word is "close" to in the language and it is
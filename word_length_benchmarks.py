@@ -0,0 +1,126 @@
+"""Benchmark how each method scales with the length of the word.
+1. Select a fixed sample of regular expressions from the regexps file
+2. For each configured word length, generate accepting words by random walks on the
+   follow automaton, and near-miss rejecting words by substituting one symbol
+3. Measure the time it takes each method to accept & reject each word
+4. Output one line per (regexp, word length) to the word length output file
+
+A method which takes longer than `max_method_seconds` on a single word (or exceeds the
+recursion limit) is not timed on the longer words of that regexp; its time is recorded as NaN.
+
+$ python word_length_benchmarks.py data
+"""
+
+import os
+import random
+from utils import *
+from methods import *
+from converters import RegExpConverter
+from nfa_words import BoundedWordEnumerator
+
+
+def select_regexps(regexps_file: str) -> list[str]:
+    """A reproducible sample of `regexps_per_length` regexps of each regexp length"""
+    bylength = dict()
+    with open(regexps_file, "r") as handle:
+        for line in handle:
+            regexp = line.removesuffix("\n")
+            crossection = bylength.get(regexp_length(regexp), list())
+            crossection.append(regexp)
+            bylength[regexp_length(regexp)] = crossection
+
+    rnd = random.Random(1)
+    sample = list()
+    for length in sorted(bylength):
+        sample.extend(rnd.sample(bylength[length], min(config().word_lengths.regexps_per_length,
+                                                       len(bylength[length]))))
+    return sample
+
+
+def near_miss(word: str, evalWordP: Callable[[str], bool], rnd: random.Random, attempts: int=20) -> str|None:
+    """A rejected word of the same length which differs from `word` in a single symbol"""
+    alphabet = sorted(config().gen.alphabet)
+    for _ in range(attempts if len(word) > 0 else 0):
+        i = rnd.randrange(len(word))
+        w = word[:i] + rnd.choice([s for s in alphabet if s != word[i]]) + word[i+1:]
+        if not evalWordP(w):
+            return w
+    return None
+
+
+def benchmark_word_lengths(regexp: str, output_file: str):
+    tree = RegExpConverter.str_to_regexp(regexp, sigma=config().gen.alphabet)
+    stats = automaton_stats(tree) # built once, before any word is timed
+    nfa = tree.nfaFollow()
+    enumerator = BoundedWordEnumerator(nfa, max(config().word_lengths.lengths) + len(nfa.States))
+    rnd = random.Random(1)
+    exhausted = set() # methods which have become too slow for longer words
+
+    for target in config().word_lengths.lengths:
+        length = enumerator.nearest_length(target)
+        if length is None:
+            print("\t\tno words of length", target)
+            continue
+
+        accepted = [enumerator.random_walk(length, rnd) for _ in range(config().word_lengths.words_per_length)]
+        rejected = [near_miss(word, nfa.evalWordP, rnd) for word in accepted]
+        rejected = [word for word in rejected if word is not None]
+
+        entry = OutputFileEntry(
+            regexp=regexp,
+            length=regexp_length(regexp),
+            nwords_acc=len(accepted),
+            nwords_rej=len(rejected),
+            avg_word_length=length
+        )
+        # every length starts pdcache cold, as if it were a new regexp, rather than warmed by the
+        # shorter words (see bench.py)
+        DERIVATIVE_CACHE.clear()
+        for method in METHODS:
+            if method in exhausted:
+                setattr(entry, entry.method_time_key(method), float("nan"))
+                continue
+
+            try:
+                for words, expected in [(accepted, True), (rejected, False)]:
+                    for w in words:
+                        res, cpu_time = method(tree, w)
+                        assert res is expected, f"{regexp} using {method.__name__} should"\
+                            f"{'' if expected else ' not'} have accepted a word of length {len(w)}. Returned {res}"
+                        entry.add_time(method, cpu_time)
+                        if cpu_time > config().word_lengths.max_method_seconds:
+                            exhausted.add(method)
+            except RecursionError:
+                # e.g., word derivatives grow with every symbol until they are too deep to recurse on
+                exhausted.add(method)
+                setattr(entry, entry.method_time_key(method), float("nan"))
+
+        for key, value in stats.items():
+            setattr(entry, key, value)
+        print("\t\t", str(length).ljust(8), " ".join(f"{method.__name__}={entry.get_time(method):.3f}"
+                                                    for method in METHODS))
+        with open(output_file, "a") as file:
+            file.write(entry.to_json() + "\n")
+
+
+if __name__ == "__main__":
+    datadir = get_output_dir()
+    regexps_file = os.path.join(datadir, config().files.regexps)
+    output_file = os.path.join(datadir, config().files.word_length_output)
+
+    if not os.path.exists(regexps_file):
+        print(f"Expecting a file of regular expressions called {regexps_file}")
+        print(f"It can be generated using 'python generate_regexps.py {datadir}'")
+        exit(1)
+
+    if os.path.exists(output_file):
+        print(f"{output_file} already exists. Please rename or delete it first.")
+        exit(1)
+
+    regexps = select_regexps(regexps_file)
+    print(f"Benchmarking {len(regexps)} regexps with word lengths {config().word_lengths.lengths}")
+    for regexp in regexps:
+        print("\t", regexp)
+        benchmark_word_lengths(regexp, output_file)
+
+    print("\n\nDone!")